@@ -0,0 +1,241 @@
+"""Binary, multi-resolution storage of stranded coverage (cseq) values.
+
+The text cseq format has to be parsed in full before a single value can
+be used. A binary cseq file stores, for each reference and strand, the
+values as compressed chunks of chunk_size values each, so any range is
+read by decompressing only the chunks it covers:
+
+>>> write('sample.bcseq', cseq._pls, cseq._mns, name=cseq.name)
+>>> coverage = BinaryCseq('sample.bcseq')
+>>> coverage.values('chr1', '+', 10000, 20000)
+
+Like bigWig zoom levels, each strand also gets precomputed summaries
+(min, max, sum and count of the values of every bin of bin_size values)
+at a few resolutions, which answer low resolution queries over whole
+chromosomes without touching the values:
+
+>>> coverage.stats('chr1', '+', 0, coverage.length('chr1'), nbins=1000)
+
+The file starts with an 8 byte magic string followed by the offset and
+length of a JSON header stored after the data. The header records for
+every reference and strand the dtype, the number of values and the
+(offset, length) of every compressed chunk and zoom array.
+
+Cseq.write_binary and Cseq.from_binary convert whole Cseq objects, and
+write_refs writes references one at a time as an IndexedCseq loads them.
+"""
+
+import json
+import struct
+import zlib
+
+import numpy as np
+
+_MAGIC = b'BLCSQ001'
+_PREFIX = struct.Struct('<QQ')
+_STRANDS = {'+': 'pls', 1: 'pls', 'plus': 'pls', 'pls': 'pls',
+            '-': 'mns', -1: 'mns', 'minus': 'mns', 'mns': 'mns'}
+_ZOOM_FIELDS = ('min', 'max', 'sum', 'count')
+_ZOOM_DTYPES = {'min': '<f8', 'max': '<f8', 'sum': '<f8', 'count': '<i8'}
+
+def _strand(hint):
+    try:
+        return _STRANDS[hint]
+    except (KeyError, TypeError):
+        raise ValueError('Unknown strand key %s' % str(hint))
+
+def _summarize(values, bin_starts, end):
+    """min, max, sum and count of the groups of values starting at each of
+    bin_starts (the last one ending at end)."""
+    values = values[:end]
+    if not len(bin_starts):
+        return dict((field, np.zeros(0, dtype=_ZOOM_DTYPES[field]))
+                    for field in _ZOOM_FIELDS)
+    return {'min': np.minimum.reduceat(values, bin_starts).astype('<f8'),
+            'max': np.maximum.reduceat(values, bin_starts).astype('<f8'),
+            'sum': np.add.reduceat(values.astype('<f8'), bin_starts),
+            'count': np.diff(np.append(bin_starts, end)).astype('<i8')}
+
+def write(filename, pls, mns, name='', header='', refs=None, **kwargs):
+    """Write the plus and minus strand values of every reference (dicts of
+    arrays by reference name) as a binary cseq file.
+
+    refs - order of the references (default: that of pls)
+
+    The other keyword arguments are those of write_refs.
+    """
+    if refs is None:
+        refs = list(pls)
+    write_refs(filename, refs, lambda ref: (pls.get(ref, []), mns.get(ref, [])),
+               name, header, **kwargs)
+
+def write_refs(filename, refs, strands, name='', header='', chunk_size=1<<16,
+               bin_sizes=(1<<10, 1<<14, 1<<18), level=6):
+    """Write a binary cseq file of references refs, getting the (plus,
+    minus) values of each from strands(ref), one reference at a time.
+
+    chunk_size - number of values compressed together
+    bin_sizes  - number of values summarized by a bin of each zoom level
+    level      - zlib compression level
+    """
+    refs = list(refs)
+    handle = open(filename, 'wb')
+    handle.write(_MAGIC)
+    handle.write(_PREFIX.pack(0, 0))
+    position = [handle.tell()]
+    def place(data):
+        data = zlib.compress(data.tobytes(), level)
+        handle.write(data)
+        offset = position[0]
+        position[0] += len(data)
+        return [offset, len(data)]
+
+    entries = {}
+    for ref in refs:
+        entry = entries[ref] = {}
+        for strand, values in zip(('pls', 'mns'), strands(ref)):
+            values = np.asarray(values)
+            dtype = values.dtype.newbyteorder('<')
+            values = values.astype(dtype)
+            chunks = [place(values[i:i+chunk_size])
+                      for i in range(0, len(values), chunk_size)]
+            zoom = {}
+            for bin_size in bin_sizes:
+                summary = _summarize(values, np.arange(0, len(values), bin_size),
+                                     len(values))
+                zoom[str(bin_size)] = dict((field, place(summary[field]))
+                                           for field in _ZOOM_FIELDS)
+            entry[strand] = {'dtype': dtype.str, 'length': len(values),
+                             'chunks': chunks, 'zoom': zoom}
+
+    header = json.dumps({'name': name, 'header': header, 'refs': refs,
+                         'chunk_size': chunk_size, 'bin_sizes': list(bin_sizes),
+                         'entries': entries}).encode('utf-8')
+    header_offset = position[0]
+    handle.write(header)
+    handle.seek(len(_MAGIC))
+    handle.write(_PREFIX.pack(header_offset, len(header)))
+    handle.close()
+
+class BinaryCseq(object):
+    """Reader of binary cseq files.
+
+    cache_size - number of decompressed chunks kept for reuse by
+                 neighbouring queries
+    """
+    def __init__(self, filename, cache_size=16):
+        self.filename = filename
+        self.handle = open(filename, 'rb')
+        if self.handle.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError('%s is not a binary cseq file' % filename)
+        offset, length = _PREFIX.unpack(self.handle.read(_PREFIX.size))
+        self.handle.seek(offset)
+        header = json.loads(self.handle.read(length).decode('utf-8'))
+        self.name = header['name']
+        self.header = header['header']
+        self.refs = header['refs']
+        self.chunk_size = header['chunk_size']
+        self.bin_sizes = header['bin_sizes']
+        self._entries = header['entries']
+        self.cache_size = cache_size
+        self._cache = {}
+        self._cache_order = []
+
+    def _entry(self, ref, strand):
+        try:
+            return self._entries[ref][_strand(strand)]
+        except KeyError:
+            raise ValueError('Invalid refname %s' % ref)
+
+    def _read(self, block, dtype):
+        offset, length = block
+        self.handle.seek(offset)
+        return np.frombuffer(zlib.decompress(self.handle.read(length)),
+                             dtype=dtype)
+
+    def _chunk(self, entry, i):
+        key = (id(entry), i)
+        chunk = self._cache.get(key)
+        if chunk is None:
+            chunk = self._read(entry['chunks'][i], entry['dtype'])
+            self._cache[key] = chunk
+            self._cache_order.append(key)
+            if len(self._cache_order) > self.cache_size:
+                del self._cache[self._cache_order.pop(0)]
+        return chunk
+
+    def length(self, ref, strand='+'):
+        """Number of values of a reference strand."""
+        return self._entry(ref, strand)['length']
+
+    def values(self, ref, strand, start=0, end=None):
+        """Return the values of positions start to end (as in a slice) of a
+        reference strand, decompressing only the chunks covering them."""
+        entry = self._entry(ref, strand)
+        length = entry['length']
+        if end is None or end > length:
+            end = length
+        start = max(start, 0)
+        if start >= end:
+            return np.zeros(0, dtype=entry['dtype'])
+        first = start // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        chunks = [self._chunk(entry, i) for i in range(first, last + 1)]
+        values = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+        offset = first * self.chunk_size
+        return values[start-offset:end-offset]
+
+    def zoom(self, ref, strand, bin_size):
+        """Return the summaries (a dict of 'min', 'max', 'sum' and 'count'
+        arrays) of a zoom level of a reference strand."""
+        entry = self._entry(ref, strand)
+        try:
+            blocks = entry['zoom'][str(bin_size)]
+        except KeyError:
+            raise ValueError('No zoom level with bin size %s' % bin_size)
+        return dict((field, self._read(blocks[field], _ZOOM_DTYPES[field]))
+                    for field in _ZOOM_FIELDS)
+
+    def stats(self, ref, strand, start=0, end=None, nbins=1, stat='mean'):
+        """Summarize positions start to end of a reference strand in nbins
+        equal bins, returning an array of the stat ('mean', 'min', 'max',
+        'sum' or 'count') of each bin.
+
+        The coarsest zoom level whose bins are no larger than the requested
+        ones is used, each output bin aggregating the zoom bins nearest to
+        its edges; as with bigWig, output bin edges are then only exact to
+        half the zoom bin size. The values themselves are read when no zoom
+        level is fine enough.
+        """
+        if stat not in _ZOOM_FIELDS and stat != 'mean':
+            raise ValueError('Unknown stat %s' % stat)
+        length = self.length(ref, strand)
+        if end is None or end > length:
+            end = length
+        start = max(start, 0)
+        if end - start < nbins:
+            raise ValueError('Fewer positions than bins')
+        edges = np.linspace(start, end, nbins + 1).astype(np.int64)
+        per_bin = float(end - start) / nbins
+        levels = [b for b in self.bin_sizes if b <= per_bin]
+        if levels:
+            bin_size = max(levels)
+            zoom = self.zoom(ref, strand, bin_size)
+            # edges rounded to the nearest zoom bin boundary
+            bounds = (edges + bin_size // 2) // bin_size
+            first, stop = bounds[0], bounds[-1]
+            starts = bounds[:-1] - first
+            summary = {
+                'min': np.minimum.reduceat(zoom['min'][first:stop], starts),
+                'max': np.maximum.reduceat(zoom['max'][first:stop], starts),
+                'sum': np.add.reduceat(zoom['sum'][first:stop], starts),
+                'count': np.add.reduceat(zoom['count'][first:stop], starts)}
+        else:
+            values = self.values(ref, strand, start, end)
+            summary = _summarize(values, edges[:-1] - start, end - start)
+        if stat == 'mean':
+            return summary['sum'] / summary['count']
+        return summary[stat]
+
+    def close(self):
+        self.handle.close()
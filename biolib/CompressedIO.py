@@ -0,0 +1,299 @@
+"""Transparent reading and writing of gzip and bzip2 compressed files.
+
+open_file opens a path by its extension: '.gz' and '.bz2' files are
+(de)compressed in a background thread, anything else is opened with open():
+
+>>> for feature in SeqFeatureIO.parse(open_file('genes.gff3.gz'), 'gff3'):
+...     pass
+
+The thread and the caller exchange blocks of about chunk_size bytes
+through a queue holding at most max_chunks of them, so decompression runs
+ahead of parsing (and compression behind formatting) by a bounded amount
+of memory. zlib and bz2 release the interpreter lock while they work, so
+the two overlap even in CPython.
+
+Concatenated gzip members (as written by bgzip) and bzip2 streams (as
+written by pbzip2) are read as one file. Reading is sequential only:
+seek() is not supported, so callers must not rely on it.
+"""
+
+import bz2
+import codecs
+import threading
+import zlib
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+_CHUNK_SIZE = 1 << 20
+_MAX_CHUNKS = 16
+
+class _Gzip(object):
+    @staticmethod
+    def decompressor():
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    @staticmethod
+    def compressor(level):
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+class _Bzip2(object):
+    @staticmethod
+    def decompressor():
+        return bz2.BZ2Decompressor()
+    @staticmethod
+    def compressor(level):
+        return bz2.BZ2Compressor(level)
+
+_codecs = {'.gz': _Gzip, '.bz2': _Bzip2}
+
+def _codec(filename):
+    for extension, codec in _codecs.items():
+        if filename.endswith(extension):
+            return codec
+    return None
+
+def is_compressed(filename):
+    """Return whether open_file would (de)compress filename."""
+    return _codec(filename) is not None
+
+def open_file(filename, mode='r', chunk_size=_CHUNK_SIZE, max_chunks=_MAX_CHUNKS,
+              level=6):
+    """Open filename for reading ('r') or writing ('w'), compressing or
+    decompressing in a background thread if it ends with .gz or .bz2.
+
+    level - compression level used when writing
+    """
+    codec = _codec(filename)
+    if codec is None:
+        return open(filename, mode)
+    if mode in ('r', 'rb', 'rt', 'rU'):
+        return ThreadedReader(filename, codec, chunk_size, max_chunks)
+    if mode in ('w', 'wb', 'wt'):
+        return ThreadedWriter(filename, codec, chunk_size, max_chunks, level)
+    raise ValueError("Unsupported mode '%s' for a compressed file" % mode)
+
+class _Failure(object):
+    def __init__(self, error):
+        self.error = error
+
+class ThreadedReader(object):
+    """A read-only file object over a compressed file, decompressed by a
+    background thread."""
+    def __init__(self, filename, codec, chunk_size=_CHUNK_SIZE,
+                 max_chunks=_MAX_CHUNKS):
+        self.name = filename
+        self.closed = False
+        self._raw = open(filename, 'rb')
+        self._codec = codec
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(max_chunks)
+        self._stop = threading.Event()
+        # text from _offset on is yet to be read
+        self._buffer = ''
+        self._offset = 0
+        self._eof = False
+        if str is not bytes:
+            self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._thread = threading.Thread(target=self._inflate)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        # give up when the reader is closed before the end of the file
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _inflate(self):
+        try:
+            decompressor = self._codec.decompressor()
+            while True:
+                data = self._raw.read(self._chunk_size)
+                if not data:
+                    break
+                while data:
+                    try:
+                        chunk = decompressor.decompress(data)
+                    except EOFError:
+                        # a bz2 stream ended exactly at the end of a block
+                        decompressor = self._codec.decompressor()
+                        continue
+                    if chunk and not self._put(chunk):
+                        return
+                    # the rest of the input after the end of a member or
+                    # stream starts the next one
+                    data = getattr(decompressor, 'unused_data', b'')
+                    if data:
+                        decompressor = self._codec.decompressor()
+        except Exception as error:
+            self._put(_Failure(error))
+            return
+        self._put(None)
+
+    def _next_chunk(self):
+        """Return the next block of decompressed text, or '' at the end."""
+        if self._eof:
+            return ''
+        chunk = self._queue.get()
+        if chunk is None:
+            self._eof = True
+            return ''
+        if isinstance(chunk, _Failure):
+            self._eof = True
+            raise IOError('Error decompressing %s: %s' % (self.name, chunk.error))
+        if str is not bytes:
+            chunk = self._decoder.decode(chunk)
+        return chunk
+
+    def _fill(self):
+        """Append the next block to the unread part of the buffer, returning
+        False at the end of the file."""
+        chunk = self._next_chunk()
+        if not chunk:
+            return False
+        # drop what was read only when a new block arrives, so that the
+        # buffer is copied once per block rather than once per line
+        self._buffer = self._buffer[self._offset:] + chunk
+        self._offset = 0
+        return True
+
+    def readline(self):
+        while True:
+            i = self._buffer.find('\n', self._offset)
+            if i >= 0:
+                line = self._buffer[self._offset:i+1]
+                self._offset = i + 1
+                return line
+            if not self._fill():
+                line = self._buffer[self._offset:]
+                self._buffer = ''
+                self._offset = 0
+                return line
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) - self._offset < size:
+            if not self._fill():
+                break
+        available = len(self._buffer) - self._offset
+        if size < 0 or size > available:
+            size = available
+        data = self._buffer[self._offset:self._offset+size]
+        self._offset += size
+        return data
+
+    def __iter__(self):
+        # hand out the complete lines of each block at once
+        while True:
+            chunk = self._next_chunk()
+            if not chunk:
+                break
+            lines = (self._buffer[self._offset:] + chunk).split('\n')
+            self._buffer = lines.pop()
+            self._offset = 0
+            for line in lines:
+                yield line + '\n'
+        if self._offset < len(self._buffer):
+            line = self._buffer[self._offset:]
+            self._buffer = ''
+            self._offset = 0
+            yield line
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+    __next__ = next
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._stop.set()
+            self._thread.join()
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ThreadedWriter(object):
+    """A write-only file object over a compressed file, compressed by a
+    background thread. The file is complete only after close()."""
+    def __init__(self, filename, codec, chunk_size=_CHUNK_SIZE,
+                 max_chunks=_MAX_CHUNKS, level=6):
+        self.name = filename
+        self.closed = False
+        self._raw = open(filename, 'wb')
+        self._compressor = codec.compressor(level)
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(max_chunks)
+        self._pending = []
+        self._pending_size = 0
+        self._error = None
+        self._thread = threading.Thread(target=self._deflate)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _deflate(self):
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    break
+                self._raw.write(self._compressor.compress(chunk))
+            self._raw.write(self._compressor.flush())
+        except Exception as error:
+            self._error = error
+            # keep draining so that the writer does not block on a full queue
+            while self._queue.get() is not None:
+                pass
+
+    def _check(self):
+        if self._error is not None:
+            raise IOError('Error compressing %s: %s' % (self.name, self._error))
+
+    def _send(self):
+        data = ''.join(self._pending)
+        if str is not bytes:
+            data = data.encode('utf-8')
+        self._queue.put(data)
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, data):
+        self._check()
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self._chunk_size:
+            self._send()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        # data is compressed in order; nothing can be forced to disk early
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if self._pending:
+                self._send()
+            self._queue.put(None)
+            self._thread.join()
+            self._raw.close()
+            self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,268 @@
+"""Stranded coverage (cseq values) built from intervals, features or reads.
+
+CoverageBuilder counts, for every position of every reference strand, the
+intervals covering it. Intervals are buffered and added chunk_size at a
+time to per-strand difference arrays (+1 at each start, -1 at each end),
+and the coverage is their cumulative sum, so the work per interval is
+constant whatever its length:
+
+>>> builder = CoverageBuilder()
+>>> builder.add_sam(open_file('sample.sam.gz'))
+>>> cseq = Cseq.from_coverage(builder, 'sample')
+>>> builder.write_binary('sample.bcseq', 'sample')
+
+Memory holds the difference arrays, one value of dtype per position and
+strand, plus at most chunk_size buffered intervals. The arrays of
+references with a known length are allocated once; those of other
+references grow as intervals arrive and may be up to twice as long.
+
+Intervals given directly are 0-based and half-open (start to end as in a
+slice). Features from SeqFeatureIO have inclusive ends and are converted.
+Unstranded intervals are counted on the plus strand.
+"""
+
+import array
+import re
+
+import numpy as np
+
+import BinaryCseq
+from biolib import _strand_code
+from samflags import BAM_FUNMAP, BAM_FREVERSE, BAM_FSECONDARY, BAM_FQCFAIL, \
+    BAM_FDUP, FlagFilter
+
+_cigar_operations = re.compile(r'(\d+)([MIDNSHP=X])')
+# CIGAR operations consuming the reference
+_reference_operations = set('MDN=X')
+
+DEFAULT_EXCLUDE = BAM_FUNMAP | BAM_FSECONDARY | BAM_FQCFAIL | BAM_FDUP
+
+def cigar_blocks(pos, cigar, split=True):
+    """Return the (start, end) reference blocks of an alignment starting at
+    0-based pos, split at skipped regions (N) if split is true."""
+    blocks = []
+    start = end = pos
+    for length, operation in _cigar_operations.findall(cigar):
+        if operation not in _reference_operations:
+            continue
+        length = int(length)
+        if operation == 'N' and split:
+            if end > start:
+                blocks.append((start, end))
+            start = end = end + length
+        else:
+            end += length
+    if end > start:
+        blocks.append((start, end))
+    return blocks
+
+class _RefCoverage(object):
+    def __init__(self, length, dtype):
+        self.length = length
+        # one more position than the reference, for the ends at its end
+        size = 0 if length is None else length + 1
+        self.diffs = {1: np.zeros(size, dtype=dtype),
+                      -1: np.zeros(size, dtype=dtype)}
+        self.max_end = 0
+        self._clear()
+
+    def _clear(self):
+        # single intervals go to typed arrays, batches are kept as given
+        self.starts = array.array('l')
+        self.ends = array.array('l')
+        self.strands = array.array('b')
+        self.batches = []
+
+    def add(self, start, end, strand):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.strands.append(strand)
+
+    def add_batch(self, starts, ends, strands):
+        self.batches.append((starts, ends, strands))
+
+    def _grow(self, size):
+        # only references of unknown length grow, doubling so that the
+        # arrays are copied a logarithmic number of times
+        for strand, diff in self.diffs.items():
+            if len(diff) < size:
+                grown = np.zeros(max(size, 2*len(diff)), dtype=diff.dtype)
+                grown[:len(diff)] = diff
+                self.diffs[strand] = grown
+
+    def flush(self):
+        if not self.starts and not self.batches:
+            return
+        batches = self.batches + [
+            (np.frombuffer(self.starts, dtype=self.starts.typecode),
+             np.frombuffer(self.ends, dtype=self.ends.typecode),
+             np.frombuffer(self.strands, dtype=np.int8))]
+        starts, ends, strands = [np.concatenate(column).astype(np.int64)
+                                 for column in zip(*batches)]
+        del batches
+        self._clear()
+        if not len(starts):
+            return
+        self.max_end = max(self.max_end, int(ends.max()))
+        self._grow(self.max_end + 1)
+        for strand in (1, -1):
+            rows = strands == strand
+            if not rows.any():
+                continue
+            diff = self.diffs[strand]
+            # counted per distinct position, so a flush costs in proportion
+            # to the chunk rather than to the reference
+            positions, counts = np.unique(starts[rows], return_counts=True)
+            diff[positions] += counts.astype(diff.dtype)
+            positions, counts = np.unique(ends[rows], return_counts=True)
+            diff[positions] -= counts.astype(diff.dtype)
+
+    def coverage(self, strand, dtype):
+        length = self.length if self.length is not None else self.max_end
+        return np.cumsum(self.diffs[strand][:length], dtype=dtype)
+
+class CoverageBuilder(object):
+    """Accumulates intervals into stranded coverage.
+
+    lengths    - optional dict of reference lengths; coverage arrays are
+                 then exactly this long and intervals are clipped to them.
+                 Other references end with their last interval.
+    dtype      - dtype of the coverage and difference arrays, which must
+                 hold the deepest coverage
+    chunk_size - number of intervals buffered before they are added
+    """
+    def __init__(self, lengths=None, dtype=np.int32, chunk_size=1<<20):
+        self.lengths = dict(lengths or {})
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        self.refs = []
+        self._refs = {}
+        self._pending = 0
+
+    def _ref(self, ref):
+        coverage = self._refs.get(ref)
+        if coverage is None:
+            coverage = self._refs[ref] = _RefCoverage(self.lengths.get(ref),
+                                                      self.dtype)
+            self.refs.append(ref)
+        return coverage
+
+    def add(self, ref, start, end, strand=1):
+        """Add one interval, start to end as in a slice."""
+        coverage = self._ref(ref)
+        start = max(int(start), 0)
+        end = int(end)
+        if coverage.length is not None:
+            end = min(end, coverage.length)
+        if end <= start:
+            return
+        strand = _strand_code(strand) or 1
+        coverage.add(start, end, strand)
+        self._pending += 1
+        if self._pending >= self.chunk_size:
+            self.flush()
+
+    def add_intervals(self, refs, starts, ends, strands=1):
+        """Add many intervals given as arrays; refs and strands may be single
+        values or sequences parallel to starts and ends."""
+        starts = np.maximum(np.asarray(starts, dtype=np.int64), 0)
+        ends = np.asarray(ends, dtype=np.int64)
+        if isinstance(strands, (list, tuple, np.ndarray)):
+            strands = np.array([_strand_code(s) or 1 for s in strands],
+                               dtype=np.int8)
+        else:
+            strands = np.repeat(np.int8(_strand_code(strands) or 1),
+                                len(starts))
+        if isinstance(refs, basestring):
+            groups = [(refs, slice(None))]
+        else:
+            refs = np.asarray(refs)
+            groups = [(str(ref), refs == ref) for ref in np.unique(refs)]
+        for ref, rows in groups:
+            coverage = self._ref(ref)
+            s = starts[rows]
+            e = ends[rows]
+            if coverage.length is not None:
+                e = np.minimum(e, coverage.length)
+            keep = e > s
+            coverage.add_batch(s[keep], e[keep], strands[rows][keep])
+            self._pending += int(keep.sum())
+        if self._pending >= self.chunk_size:
+            self.flush()
+
+    def add_features(self, features, stranded=True, split=False):
+        """Add the features of an iterable, e.g. from SeqFeatureIO.parse
+        (GFF3, GTF or BED). With split, BED12 blocks (or sub_features) are
+        added instead of the whole feature."""
+        for feature in features:
+            strand = feature.strand if stranded else 1
+            blocks = None
+            if split:
+                if hasattr(feature, 'blocks'):
+                    blocks = feature.blocks
+                elif getattr(feature, 'sub_features', None):
+                    blocks = [(int(f.location.nofuzzy_start),
+                               int(f.location.nofuzzy_end))
+                              for f in feature.sub_features]
+            if blocks is None:
+                blocks = [(int(feature.location.nofuzzy_start),
+                           int(feature.location.nofuzzy_end))]
+            for start, end in blocks:
+                # feature ends are inclusive
+                self.add(feature.ref, start, end + 1, strand)
+
+    def add_sam(self, lines, include=0, exclude=DEFAULT_EXCLUDE, split=True,
+                flip_strand=False):
+        """Add the aligned blocks of the reads of SAM text lines.
+
+        include     - flags a read must all have (samtools view -f)
+        exclude     - flags a read must not have any of (samtools view -F;
+                      by default unmapped, secondary, QC failed and
+                      duplicate reads), both as accepted by
+                      samflags.parse_flags
+        split       - split reads at skipped regions (N), as for RNA-seq
+        flip_strand - count reads on the opposite strand, for libraries
+                      sequencing the reverse complement (e.g. dUTP)
+
+        Returns the number of reads added.
+        """
+        keep = FlagFilter(include, exclude)
+        added = 0
+        for line in lines:
+            if line[0] == '@':
+                continue
+            fields = line.split('\t', 6)
+            flag = int(fields[1])
+            if not keep(flag):
+                continue
+            ref = fields[2]
+            if ref == '*' or flag & BAM_FUNMAP or fields[5] == '*':
+                continue
+            strand = -1 if flag & BAM_FREVERSE else 1
+            if flip_strand:
+                strand = -strand
+            for start, end in cigar_blocks(int(fields[3]) - 1, fields[5], split):
+                self.add(ref, start, end, strand)
+            added += 1
+        return added
+
+    def flush(self):
+        """Add the buffered intervals to the difference arrays."""
+        for coverage in self._refs.values():
+            coverage.flush()
+        self._pending = 0
+
+    def arrays(self):
+        """Return the (plus, minus) coverage dicts of arrays by reference."""
+        self.flush()
+        pls = {}
+        mns = {}
+        for ref, coverage in self._refs.items():
+            pls[ref] = coverage.coverage(1, self.dtype)
+            mns[ref] = coverage.coverage(-1, self.dtype)
+        return pls, mns
+
+    def write_binary(self, filename, name='coverage', header='', **kwargs):
+        """Write the coverage as a binary cseq file (see BinaryCseq.write)."""
+        pls, mns = self.arrays()
+        BinaryCseq.write(filename, pls, mns, name, header, self.refs, **kwargs)
@@ -0,0 +1,194 @@
+"""Per-reference interval index over SeqFeatureIO feature streams.
+
+A GenomeIndex consumes an iterator of features, such as the one returned
+by SeqFeatureIO.parse, in a single pass and keeps one IntervalArray per
+feature.ref:
+
+>>> index = GenomeIndex.from_file(open('genes.gff3'), 'gff3')
+>>> for feature in index.overlapping('chr1', 10000, 20000, strand='+',
+...                                  types=['exon']):
+...     print feature.attributes['Parent']
+
+Coordinates are those of the features' locations and, as in IntervalTree,
+both ends are inclusive.
+
+A built index can be saved to a single binary file and loaded again with
+mmap, so that loading costs no parsing and the pages are shared between
+processes that load the same file:
+
+>>> index.save('genes.gidx')
+>>> index = GenomeIndex.load('genes.gidx')
+
+The file is a MappedArrays file holding, per reference, the IntervalArray
+arrays, the strand and type code columns and a text payload: every
+feature written as one line of the payload format, plus the offsets of
+those lines. Lookups run on the mapped arrays and only the lines of the
+features actually returned are parsed.
+"""
+
+import array
+from StringIO import StringIO
+
+import numpy as np
+
+import MappedArrays
+import SeqFeatureIO
+from IntervalArray import IntervalArray
+from biolib import _strand_code
+
+def _as_ndarray(values):
+    return np.frombuffer(values, dtype=values.typecode)
+
+class _RefIndex(object):
+    """Features of a single reference plus their columns, gathered into
+    compact arrays while the stream is read."""
+    def __init__(self):
+        self.begins = array.array('l')
+        self.ends = array.array('l')
+        self.strands = array.array('b')
+        self.types = array.array('l')
+        self.features = []
+        self.intervals = None
+
+    def add(self, feature, type_code):
+        self.begins.append(int(feature.location.nofuzzy_start))
+        self.ends.append(int(feature.location.nofuzzy_end))
+        self.strands.append(_strand_code(feature.strand))
+        self.types.append(type_code)
+        self.features.append(feature)
+
+    def feature(self, i):
+        return self.features[i]
+
+    def freeze(self):
+        self.intervals = IntervalArray(_as_ndarray(self.begins),
+                                       _as_ndarray(self.ends))
+        self.strands = _as_ndarray(self.strands)
+        self.types = _as_ndarray(self.types)
+        del self.begins, self.ends
+
+    def __len__(self):
+        return len(self.features)
+
+class _MappedRefIndex(object):
+    """The arrays of a single reference viewed directly from a mapped
+    GenomeIndex file."""
+    def __init__(self, arrays, format):
+        self.intervals = IntervalArray.from_arrays(
+            *[arrays[name] for name in _interval_arrays])
+        self.strands = arrays['strands']
+        self.types = arrays['types']
+        self.payload_offsets = arrays['payload_offsets']
+        self.payload = arrays['payload']
+        self.format = format
+
+    def feature(self, i):
+        start = self.payload_offsets[i]
+        end = self.payload_offsets[i+1]
+        handle = StringIO(self.payload[start:end].tobytes())
+        return next(SeqFeatureIO.parse(handle, self.format))
+
+    def __len__(self):
+        return len(self.strands)
+
+_interval_arrays = ['begins', 'ends', 'max_ends', 'order', 'offsets']
+
+class GenomeIndex(object):
+    def __init__(self, features):
+        """Index features, an iterable of SeqFeature objects carrying a ref
+        attribute, e.g. as returned by SeqFeatureIO.parse."""
+        self._refs = {}
+        self._type_codes = {}
+        for feature in features:
+            ref = self._refs.get(feature.ref)
+            if ref is None:
+                ref = self._refs[feature.ref] = _RefIndex()
+            type_code = self._type_codes.setdefault(feature.type,
+                                                    len(self._type_codes))
+            ref.add(feature, type_code)
+        for ref in self._refs.values():
+            ref.freeze()
+
+    @classmethod
+    def from_file(cls, handle, format):
+        """Index every feature of a file readable by SeqFeatureIO.parse."""
+        return cls(SeqFeatureIO.parse(handle, format))
+
+    @property
+    def refs(self):
+        return self._refs.keys()
+
+    def overlapping(self, ref, start, end, strand=None, types=None):
+        """Return the features on ref overlapping [start, end], ordered by
+        start.
+
+        strand - only report features on this strand (1/-1/0 or '+'/'-'/'.').
+        types  - only report features whose type is in this collection.
+        """
+        index = self._refs.get(ref)
+        if index is None:
+            return []
+        hits = index.intervals.search(start, end)
+        if strand is not None:
+            hits = hits[index.strands[hits] == _strand_code(strand)]
+        if types is not None:
+            codes = [self._type_codes[t] for t in types if t in self._type_codes]
+            hits = hits[np.isin(index.types[hits], codes)]
+        return [index.feature(i) for i in hits]
+
+    def save(self, filename, format='gff3'):
+        """Write the index to filename for later use with load().
+
+        format - SeqFeatureIO format in which the features themselves are
+                 stored; features returned by a loaded index are the ones
+                 parsed back from this format.
+        """
+        arrays = []
+        for name, index in self._refs.items():
+            def add(array_name, values, dtype):
+                arrays.append(([name, array_name], np.asarray(values, dtype=dtype)))
+            for array_name, values in zip(_interval_arrays,
+                                          index.intervals.arrays()):
+                add(array_name, values, np.int64)
+            add('strands', index.strands, np.int8)
+            add('types', index.types, np.int64)
+
+            payload = StringIO()
+            writer = SeqFeatureIO._FormatToWriter[format](payload)
+            writer.write_header()
+            header_length = payload.tell()
+            offsets = []
+            for i in range(len(index)):
+                offsets.append(payload.tell() - header_length)
+                writer.write_feature(index.feature(i))
+            offsets.append(payload.tell() - header_length)
+            add('payload_offsets', offsets, np.int64)
+            add('payload', bytearray(payload.getvalue()[header_length:]),
+                np.uint8)
+
+        MappedArrays.write(filename, arrays, kind='GenomeIndex', format=format,
+                           types=sorted(self._type_codes,
+                                        key=self._type_codes.get))
+
+    @classmethod
+    def load(cls, filename):
+        """Map an index written by save(). The arrays are used in place and
+        features are parsed from the mapped file only when returned."""
+        meta, arrays = MappedArrays.load(filename)
+        if meta.get('kind') != 'GenomeIndex':
+            raise ValueError('%s is not a GenomeIndex file' % filename)
+        by_ref = {}
+        for (ref, array_name), values in arrays:
+            by_ref.setdefault(ref, {})[array_name] = values
+
+        index = cls.__new__(cls)
+        index._type_codes = dict((t, i) for i, t in enumerate(meta['types']))
+        index._refs = dict((ref, _MappedRefIndex(ref_arrays, meta['format']))
+                           for ref, ref_arrays in by_ref.items())
+        return index
+
+    def __contains__(self, ref):
+        return ref in self._refs
+
+    def __len__(self):
+        return sum(len(ref) for ref in self._refs.values())
@@ -0,0 +1,142 @@
+"""Array-backed interval index for vectorized batch overlap queries.
+
+An IntervalArray keeps interval begins and ends in flat NumPy arrays
+instead of one Python object per interval, and answers a whole batch of
+query intervals in a single call:
+
+>>> idx = IntervalArray([10, 20, 35], [25, 30, 40])
+>>> query_idx, hit_idx = idx.search_batch([0, 26], [12, 36])
+>>> query_idx.tolist(), hit_idx.tolist()
+([0, 1, 1], [0, 1, 2])
+
+Intervals are closed, as in IntervalTree: [begin, end] overlaps the query
+[qbegin, qend] when begin <= qend and end >= qbegin. Hits are reported as
+indices into the arrays the index was built from.
+
+Internally the intervals are binned by length (powers of two) and each bin
+is sorted by begin and augmented with a running maximum of the ends. For a
+query, the candidates in a bin are the contiguous run between the first
+interval whose running max end reaches qbegin and the last interval that
+begins before qend; binning by length keeps a few very long intervals from
+inflating that run for every other interval.
+"""
+
+import numpy as np
+
+class IntervalArray(object):
+    def __init__(self, begins, ends):
+        begins = np.asarray(begins, dtype=np.int64).ravel()
+        ends = np.asarray(ends, dtype=np.int64).ravel()
+        if len(begins) != len(ends):
+            raise ValueError('begins and ends must have the same length')
+        if np.any(ends < begins):
+            raise ValueError('interval ends must not precede their begins')
+
+        # bin b holds the intervals with 2**(b-1) <= length+1 < 2**b
+        bins = np.frexp((ends - begins + 1).astype(np.float64))[1]
+        order = np.lexsort((begins, bins))
+        bins = bins[order]
+        bin_starts = np.unique(bins, return_index=True)[1]
+        offsets = np.append(bin_starts, len(order)).astype(np.int64)
+
+        begins = begins[order]
+        ends = ends[order]
+        max_ends = np.empty_like(ends)
+        for lo, hi in zip(offsets[:-1], offsets[1:]):
+            np.maximum.accumulate(ends[lo:hi], out=max_ends[lo:hi])
+
+        self._set_arrays(begins, ends, max_ends, order.astype(np.int64),
+                         offsets)
+
+    @classmethod
+    def from_arrays(cls, begins, ends, max_ends, order, offsets):
+        """Wrap arrays previously exported through arrays() without copying
+        or re-sorting them."""
+        index = cls.__new__(cls)
+        index._set_arrays(begins, ends, max_ends, order, offsets)
+        return index
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        """Build an index over IntervalTree.Interval objects. Hits refer to
+        positions in the intervals sequence."""
+        intervals = list(intervals)
+        return cls([k.begin for k in intervals], [k.end for k in intervals])
+
+    def _set_arrays(self, begins, ends, max_ends, order, offsets):
+        self.begins = begins
+        self.ends = ends
+        self.max_ends = max_ends
+        self.order = order
+        self.offsets = offsets
+
+    def arrays(self):
+        """Return the internal (begins, ends, max_ends, order, offsets)
+        arrays, in the form accepted by from_arrays()."""
+        return self.begins, self.ends, self.max_ends, self.order, self.offsets
+
+    def search(self, begin, end=None):
+        """Return the indices of the intervals overlapping the point begin,
+        or the range [begin, end], ordered by interval begin."""
+        if end is None:
+            end = begin
+        return self.search_batch([begin], [end])[1]
+
+    def search_batch(self, qbegins, qends, chunk_size=1 << 16):
+        """Find all overlaps between a batch of query intervals and the index.
+
+        qbegins, qends - sequences or arrays of closed query coordinates.
+        chunk_size     - number of queries resolved per vectorized step;
+                         bounds the size of the temporary candidate arrays.
+
+        Returns a pair of int64 arrays (query_idx, hit_idx), one entry per
+        overlapping pair, grouped by query in query order and ordered by
+        interval begin within each query.
+        """
+        qbegins = np.asarray(qbegins, dtype=np.int64).ravel()
+        qends = np.asarray(qends, dtype=np.int64).ravel()
+        if len(qbegins) != len(qends):
+            raise ValueError('qbegins and qends must have the same length')
+
+        query_parts = []
+        hit_parts = []
+        for first in range(0, len(qbegins), chunk_size):
+            chunk = slice(first, first + chunk_size)
+            q, h = self._search_chunk(qbegins[chunk], qends[chunk])
+            query_parts.append(q + first)
+            hit_parts.append(h)
+        if not query_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        query_idx = np.concatenate(query_parts)
+        hit_idx = np.concatenate(hit_parts)
+        return query_idx, hit_idx
+
+    def _search_chunk(self, qbegins, qends):
+        query_parts = []
+        pos_parts = []
+        for lo, hi in zip(self.offsets[:-1], self.offsets[1:]):
+            first = lo + np.searchsorted(self.max_ends[lo:hi], qbegins, 'left')
+            last = lo + np.searchsorted(self.begins[lo:hi], qends, 'right')
+            counts = np.maximum(last - first, 0)
+            total = counts.sum()
+            if total == 0:
+                continue
+            query = np.repeat(np.arange(len(qbegins), dtype=np.int64), counts)
+            # position of each candidate: its query's first candidate plus
+            # its rank within that query's run
+            run_starts = np.cumsum(counts) - counts
+            pos = np.arange(total, dtype=np.int64) + \
+                np.repeat(first - run_starts, counts)
+            keep = self.ends[pos] >= qbegins[query]
+            query_parts.append(query[keep])
+            pos_parts.append(pos[keep])
+        if not query_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        query = np.concatenate(query_parts)
+        pos = np.concatenate(pos_parts)
+        # regroup the per-bin results by query, then by begin
+        by_query = np.lexsort((self.begins[pos], query))
+        return query[by_query], self.order[pos[by_query]]
+
+    def __len__(self):
+        return len(self.begins)
@@ -21,27 +21,40 @@ class IntervalTree:
         self.top_node = self.divide_intervals(intervals)
 
     def divide_intervals(self, intervals):
-
+        # sort once by begin and once by end; stable partitions keep both
+        # orders intact all the way down, so each level of the tree is built
+        # in linear time and every node receives its center list presorted.
+        # the tree is built with an explicit stack so that skewed inputs
+        # cannot exhaust the recursion limit.
         if not intervals:
             return None
 
-        x_center = self.center(intervals)
+        top = Node(None, [], None, None, [])
+        stack = [(sort_by_begin(intervals), sort_by_end(intervals), top, 'left_node')]
+        del intervals
 
-        s_center = []
-        s_left = []
-        s_right = []
+        while stack:
+            by_begin, by_end, parent, side = stack.pop()
+            x_center = by_begin[len(by_begin)//2].begin
 
-        for k in intervals:
-            if k.end < x_center:
-                s_left.append(k)
-            elif k.begin > x_center:
-                s_right.append(k)
-            else:
-                s_center.append(k)
-        del intervals
+            node = Node(x_center,
+                        [k for k in by_begin if k.begin <= x_center <= k.end],
+                        None, None,
+                        [k for k in by_end if k.begin <= x_center <= k.end])
+            setattr(parent, side, node)
 
-        return Node(x_center, s_center, self.divide_intervals(s_left), self.divide_intervals(s_right))
-        
+            left_by_begin = [k for k in by_begin if k.end < x_center]
+            if left_by_begin:
+                stack.append((left_by_begin,
+                              [k for k in by_end if k.end < x_center],
+                              node, 'left_node'))
+            right_by_begin = [k for k in by_begin if k.begin > x_center]
+            if right_by_begin:
+                stack.append((right_by_begin,
+                              [k for k in by_end if k.begin > x_center],
+                              node, 'right_node'))
+
+        return top.left_node
 
     def center(self, intervals):
         fs = sort_by_begin(intervals)
@@ -50,29 +63,57 @@ class IntervalTree:
         return fs[int(length/2)].begin
 
     def search(self, begin, end=None):
-        if end:
-            result = []
-
-            for j in xrange(begin, end+1):
-                for k in self.search(j):
-                    result.append(k)
-                result = list(set(result))
-            return sort_by_begin(result)
+        if not self.top_node:
+            return []
+        if end is not None:
+            return sort_by_begin(self._search_range(self.top_node, begin, end, []))
         else:
             return self._search(self.top_node, begin, [])
     def _search(self, node, point, result):
-        
-        for k in node.s_center:
-            if k.begin <= point <= k.end:
-                result.append(k)
-        if point < node.x_center and node.left_node:
-            for k in self._search(node.left_node, point, []):
-                result.append(k)
-        if point > node.x_center and node.right_node:
-            for k in self._search(node.right_node, point, []):
-                result.append(k)
-
-        return list(set(result))
+        # every interval in a node's center contains x_center, so left of it
+        # only the begins need checking and right of it only the ends
+        while node:
+            if point < node.x_center:
+                for k in node.s_center:
+                    if k.begin > point:
+                        break
+                    result.append(k)
+                node = node.left_node
+            elif point > node.x_center:
+                for k in reversed(node.s_center_by_end):
+                    if k.end < point:
+                        break
+                    result.append(k)
+                node = node.right_node
+            else:
+                result.extend(node.s_center)
+                node = None
+
+        return result
+    def _search_range(self, node, begin, end, result):
+        # every interval is stored in exactly one node, so a single descent
+        # visits each overlapping interval once and no deduplication is needed
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if end < node.x_center:
+                for k in node.s_center:
+                    if k.begin > end:
+                        break
+                    result.append(k)
+            elif begin > node.x_center:
+                for k in reversed(node.s_center_by_end):
+                    if k.end < begin:
+                        break
+                    result.append(k)
+            else:
+                result.extend(node.s_center)
+            if begin < node.x_center and node.left_node:
+                stack.append(node.left_node)
+            if end > node.x_center and node.right_node:
+                stack.append(node.right_node)
+
+        return result
 
 class Interval:
     def __init__(self, begin, end, object=None):
@@ -86,11 +127,168 @@ class Interval:
         return self.end
 
 class Node:
-    def __init__(self, x_center, s_center, left_node, right_node):
+    def __init__(self, x_center, s_center, left_node, right_node, s_center_by_end=None):
         self.x_center = x_center
-        self.s_center = sort_by_begin(s_center)
+        if s_center_by_end is None:
+            s_center = sort_by_begin(s_center)
+            s_center_by_end = sort_by_end(s_center)
+        # otherwise both lists are taken to be presorted
+        self.s_center = s_center
+        self.s_center_by_end = s_center_by_end
         self.left_node = left_node
         self.right_node = right_node
 
 def sort_by_begin(intervals):
     return sorted(intervals, key=lambda x: x.begin)
+
+def sort_by_end(intervals):
+    return sorted(intervals, key=lambda x: x.end)
+
+class DynamicIntervalTree:
+    # AVL tree keyed by (begin, end), each node augmented with the largest
+    # end in its subtree. intervals with equal coordinates share a node.
+    # add and remove run in O(log n); search has the same interface as
+    # IntervalTree.search and always returns intervals sorted by begin.
+    def __init__(self, intervals=()):
+        self.top_node = None
+        self.count = 0
+        for k in intervals:
+            self.add(k)
+
+    def add(self, interval):
+        self.top_node = self._add(self.top_node, interval)
+        self.count += 1
+
+    def remove(self, interval):
+        self.top_node = self._remove(self.top_node, interval)
+        self.count -= 1
+
+    def _add(self, node, interval):
+        if node is None:
+            return DynamicNode(interval)
+        key = (interval.begin, interval.end)
+        if key == node.key:
+            node.intervals.append(interval)
+            return node
+        if key < node.key:
+            node.left_node = self._add(node.left_node, interval)
+        else:
+            node.right_node = self._add(node.right_node, interval)
+        return rebalance(node)
+
+    def _remove(self, node, interval):
+        if node is None:
+            raise ValueError('interval is not in the tree')
+        key = (interval.begin, interval.end)
+        if key < node.key:
+            node.left_node = self._remove(node.left_node, interval)
+        elif key > node.key:
+            node.right_node = self._remove(node.right_node, interval)
+        else:
+            for i, k in enumerate(node.intervals):
+                if k is interval:
+                    del node.intervals[i]
+                    break
+            else:
+                raise ValueError('interval is not in the tree')
+            if node.intervals:
+                return node
+            if node.left_node is None:
+                return node.right_node
+            if node.right_node is None:
+                return node.left_node
+            successor = node.right_node
+            while successor.left_node:
+                successor = successor.left_node
+            successor.right_node = self._remove_first(node.right_node)
+            successor.left_node = node.left_node
+            node = successor
+        return rebalance(node)
+
+    def _remove_first(self, node):
+        if node.left_node is None:
+            return node.right_node
+        node.left_node = self._remove_first(node.left_node)
+        return rebalance(node)
+
+    def search(self, begin, end=None):
+        if end is None:
+            end = begin
+        return self._search(self.top_node, begin, end, [])
+    def _search(self, node, begin, end, result):
+        # in-order walk, skipping subtrees that end before the query and
+        # stopping once nodes begin after it
+        if node is None or node.max_end < begin:
+            return result
+        self._search(node.left_node, begin, end, result)
+        if node.key[0] > end:
+            return result
+        if node.key[1] >= begin:
+            result.extend(node.intervals)
+        return self._search(node.right_node, begin, end, result)
+
+    def __iter__(self):
+        stack = []
+        node = self.top_node
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left_node
+            else:
+                node = stack.pop()
+                for k in node.intervals:
+                    yield k
+                node = node.right_node
+
+    def __len__(self):
+        return self.count
+
+class DynamicNode(object):
+    __slots__ = ('key', 'intervals', 'left_node', 'right_node', 'height', 'max_end')
+    def __init__(self, interval):
+        self.key = (interval.begin, interval.end)
+        self.intervals = [interval]
+        self.left_node = None
+        self.right_node = None
+        self.height = 1
+        self.max_end = interval.end
+
+    def update(self):
+        self.height = 1 + max(height(self.left_node), height(self.right_node))
+        self.max_end = self.key[1]
+        if self.left_node and self.left_node.max_end > self.max_end:
+            self.max_end = self.left_node.max_end
+        if self.right_node and self.right_node.max_end > self.max_end:
+            self.max_end = self.right_node.max_end
+
+def height(node):
+    return node.height if node else 0
+
+def rotate_left(node):
+    top = node.right_node
+    node.right_node = top.left_node
+    top.left_node = node
+    node.update()
+    top.update()
+    return top
+
+def rotate_right(node):
+    top = node.left_node
+    node.left_node = top.right_node
+    top.right_node = node
+    node.update()
+    top.update()
+    return top
+
+def rebalance(node):
+    node.update()
+    balance = height(node.left_node) - height(node.right_node)
+    if balance > 1:
+        if height(node.left_node.left_node) < height(node.left_node.right_node):
+            node.left_node = rotate_left(node.left_node)
+        return rotate_right(node)
+    if balance < -1:
+        if height(node.right_node.right_node) < height(node.right_node.left_node):
+            node.right_node = rotate_right(node.right_node)
+        return rotate_left(node)
+    return node
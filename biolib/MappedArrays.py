@@ -0,0 +1,77 @@
+"""Raw array files read through mmap, for sharing arrays between processes.
+
+write() stores a list of (key, array) pairs, keys being any JSON value,
+with the raw bytes of every array at an 8 byte aligned offset. load()
+maps the file and returns read-only NumPy views of the arrays in place,
+without copying or parsing anything:
+
+>>> write('sample.cseqmap', [(['pls', 'chr1'], pls)], name='sample')
+>>> meta, arrays = load('sample.cseqmap')
+
+Every process that loads the same file shares the pages of the OS page
+cache, so the memory used by a pool of workers does not grow with their
+number. Hand the workers the filename rather than the arrays, which
+would be copied when pickled.
+
+The file starts with an 8 byte magic string, the length of a JSON header
+and the header itself (the meta data and the key, offset, count and
+dtype of every array), and arrays are stored in the byte order of the
+machine that wrote them.
+
+GenomeIndex.save/GenomeIndex.load, Cseq.write_mmap/Cseq.open_mmap and
+Eseq.write_mmap/Eseq.open_mmap use this layout.
+"""
+
+import json
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+_MAGIC = b'BLMAPARR'
+
+def _padding(length, alignment=8):
+    return b'\0' * (-length % alignment)
+
+def write(filename, arrays, **meta):
+    """Write (key, array) pairs, plus the JSON serializable keyword
+    arguments as meta data, to filename."""
+    entries = []
+    position = 0
+    arrays = [(key, np.ascontiguousarray(values)) for key, values in arrays]
+    for key, values in arrays:
+        entries.append([key, position, len(values), values.dtype.str])
+        position += values.nbytes + len(_padding(values.nbytes))
+    header = json.dumps({'byteorder': sys.byteorder, 'meta': meta,
+                         'arrays': entries}).encode('utf-8')
+    prefix_length = len(_MAGIC) + 8 + len(header)
+    handle = open(filename, 'wb')
+    handle.write(_MAGIC)
+    handle.write(struct.pack('<Q', len(header)))
+    handle.write(header)
+    handle.write(_padding(prefix_length))
+    for key, values in arrays:
+        handle.write(values.tobytes())
+        handle.write(_padding(values.nbytes))
+    handle.close()
+
+def load(filename):
+    """Map a file written by write(), returning its meta data and a list of
+    (key, array) pairs whose arrays are read-only views of the mapping."""
+    handle = open(filename, 'rb')
+    buf = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    handle.close()
+    if buf[:len(_MAGIC)] != _MAGIC:
+        raise ValueError('%s is not a mapped array file' % filename)
+    header_length, = struct.unpack('<Q', buf[len(_MAGIC):len(_MAGIC)+8])
+    prefix_length = len(_MAGIC) + 8 + header_length
+    header = json.loads(buf[len(_MAGIC)+8:prefix_length].decode('utf-8'))
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError('%s was written on a %s-endian machine' %
+                         (filename, header['byteorder']))
+    data_start = prefix_length + len(_padding(prefix_length))
+    arrays = [(key, np.frombuffer(buf, dtype=dtype, count=count,
+                                  offset=data_start + offset))
+              for key, offset, count, dtype in header['arrays']]
+    return header['meta'], arrays
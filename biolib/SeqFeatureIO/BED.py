@@ -1,119 +1,209 @@
 """Supplement the missing support for BED from biopython.
-Taken from FastaIO"""
+
+BED3 to BED12 lines are read as BEDRecord objects by BEDRecordIterator
+('bed-record' format) or as SeqFeatures by BEDIterator ('bed' format).
+Columns beyond the twelfth (BED12+n) are kept as they are.
+
+As for GFF3, coordinates follow the closed intervals of the SeqFeatures of
+this package: BED start is used as it is and the exclusive BED end is
+shifted down by one, so features convert between BED and GFF3 unchanged.
+"""
 
 from Bio.SeqFeature import SeqFeature,FeatureLocation
 
-_gff3_strand_to_numeric = { '+': 1, '-': -1, '.': 0}
-_numeric_to_gff3_strand = { '1': '+', '-1': '-', '0': '.' }
+from Interfaces import FeatureWriter
+
+_bed_strand_to_numeric = { '+': 1, '-': -1, '.': 0}
+_strand_symbols = { 1: '+', -1: '-', 0: '.', None: '.' }
+
+def _int_list(text):
+  return [int(x) for x in text.rstrip(',').split(',') if x]
+
+class BEDRecord(object):
+  """A single BED line split into its columns, without building a SeqFeature.
+
+  start and end are 0-based and inclusive. name, score and item_rgb are the
+  raw column text (None when the line has fewer columns), thick_start and
+  thick_end are ints in the coordinates of start and end, and the block
+  columns are only split into lists when block_sizes, block_starts or
+  blocks is first accessed. to_seqfeature() builds the equivalent
+  SeqFeature on demand.
+  """
+  __slots__ = ('ref','start','end','name','score','strand','thick_start',
+               'thick_end','item_rgb','block_count','_block_sizes',
+               '_block_starts','extra','columns')
+
+  def __init__(self,ref,start,end,*optional):
+    self.columns = 3 + len(optional)
+    name,score,strand,thick_start,thick_end,item_rgb,block_count, \
+      block_sizes,block_starts = (optional + (None,)*9)[:9]
+    self.ref = ref
+    self.start = int(start)
+    self.end = int(end)-1 # BED ends are exclusive
+    self.name = name
+    self.score = score
+    self.strand = _bed_strand_to_numeric[strand or '.']
+    self.thick_start = None if thick_start is None else int(thick_start)
+    self.thick_end = None if thick_end is None else int(thick_end)-1
+    self.item_rgb = item_rgb
+    self.block_count = None if block_count is None else int(block_count)
+    self._block_sizes = block_sizes
+    self._block_starts = block_starts
+    self.extra = optional[9:]
+
+  def __getstate__(self):
+    return [getattr(self,slot) for slot in self.__slots__]
+
+  def __setstate__(self,state):
+    for slot,value in zip(self.__slots__,state):
+      setattr(self,slot,value)
+
+  @property
+  def block_sizes(self):
+    if self._block_sizes is None:
+      return None
+    if not isinstance(self._block_sizes,list):
+      self._block_sizes = _int_list(self._block_sizes)
+    return self._block_sizes
+
+  @property
+  def block_starts(self):
+    if self._block_starts is None:
+      return None
+    if not isinstance(self._block_starts,list):
+      self._block_starts = _int_list(self._block_starts)
+    return self._block_starts
+
+  @property
+  def blocks(self):
+    """(start, end) of every block, in the coordinates of start and end. A
+    line without block columns is a single block."""
+    if self._block_starts is None:
+      return [(self.start,self.end)]
+    return [(self.start+s,self.start+s+size-1)
+            for s,size in zip(self.block_starts,self.block_sizes)]
+
+  @property
+  def type(self):
+    return 'region'
+
+  @property
+  def id(self):
+    return self.name
+
+  @property
+  def attributes(self):
+    return {} if self.name is None else {'Name': self.name}
+
+  @property
+  def location(self):
+    return FeatureLocation(self.start,self.end)
+
+  def to_seqfeature(self):
+    result = SeqFeature(location=FeatureLocation(self.start,self.end),
+      type=self.type,strand=self.strand,ref=self.ref)
+    result.id = result.name = self.name
+    result.attributes = self.attributes # not an official property of SeqFeature.
+    if self.score is not None and self.score != '.':
+      result.score = self.score
+    if self.thick_start is not None:
+      result.thick_start = self.thick_start
+      result.thick_end = self.thick_end
+    if self.item_rgb is not None:
+      result.item_rgb = self.item_rgb
+    if self._block_starts is not None:
+      result.sub_features = [
+        SeqFeature(location=FeatureLocation(start,end),type='exon',
+                   strand=self.strand,ref=self.ref)
+        for start,end in self.blocks]
+    return result
+
+def _is_header(line):
+  return line[0] == '#' or line.startswith('track') or \
+    line.startswith('browser') or not line.strip()
 
 #This is a generator function!
-def BEDIterator(handle):
-  """Generator function to iterate over Fasta records (as SeqRecord objects).
+def BEDRecordIterator(handle):
+  """Generator function to iterate over BED lines as BEDRecord objects.
 
   handle - input file
 
-  If this is not given, then the entire title line will be used
-  as the description, and the first word as the id and name.
-
-  Note that use of title2ids matches that of Bio.Fasta.SequenceParser
-  but the defaults are slightly different.
+  Comment, track, browser and blank lines are skipped.
   """
   line_no = 0
-  #Skip any text before the first record (e.g. blank lines, comments)
-  while True :
+  for line in handle:
     line_no += 1
-    line = handle.readline().strip()
-    if not line:
-      return
-    if line[0] == "#" or len(line) == 0:
+    if _is_header(line):
       continue
+    fields = line.strip().split('\t')
     try:
-      ref,source,type,start,end,score,strand,frame,attributes = \
-        line.split("\t")
-    except:
-      raise FormatError, "Problem with line %d in %s.  Line was\n%s" %\
-        (line_no,handle.name,line)
-
-    attr_pairs = attributes.strip(';').split(";")
-    attr_dict = dict(map(lambda x: tuple(x.split("=")), attr_pairs))
-    result = SeqFeature(location=FeatureLocation(int(start),int(end)),
-      type=type,strand=_gff3_strand_to_numeric[strand],ref=ref,ref_db=source)
-    result.id = attr_dict.get("ID",None)
-    result.name = attr_dict.get("Name",None)
-    result.attributes = attr_dict # not an official property of SeqFeature.
-    yield result
-
-class BEDWriter:
-    """Class to write Fasta format files."""
-    def __init__(self, handle):
-        """Create a Fasta writer.
-
-        handle - Handle to an output file, e.g. as returned
-                 by open(filename, "w")
-        You can either use:
-
-        myWriter = FastaWriter(open(filename,"w"))
-        writer.write_file(myRecords)
-
-        Or, follow the sequential file writer system, for example:
-
-        myWriter = FastaWriter(open(filename,"w"))
-        writer.write_header() # does nothing for Fasta files
-        ...
-        Multiple calls to writer.write_record() and/or writer.write_records()
-        ...
-        writer.write_footer() # does nothing for Fasta files
-        writer.close()
-        """
-        self.handle = handle
-        self._header_written = False
-        self._feature_written = False
-
-    def write_header(self):
-      self.handle.write("##gff-version 3\n")
-      self._header_written = True
-
-    def write_feature(self, feature):
-      """Write a single BED feature to the file."""
-      if not self._header_written:
-        self.write_header()
-      self._feature_written = True
-      
-      source = getattr(feature,"ref_db","Unknown") or 'Unknown'
-      try:
-          if int(feature.score) == feature.score:
-              score = str(int(feature.score))
-          elif isinstance(feature.score,float):
-              score = '%0.3f' % feature.score
-          else:
-              score = str(feature.score)
-      except AttributeError:
-          score = '.'
-      except TypeError:
-          score = str(feature.score)
-
-      self.handle.write("\t".join([
-        feature.ref,
-        source,
-        feature.type,
-        str(int(feature.location.nofuzzy_start)+1), # gff3=1-base  SeqFeature=0-base
-        str(int(feature.location.nofuzzy_end)+1),
-        score,
-        _numeric_to_gff3_strand[str(feature.strand)],
-        getattr(feature,'phase','.') or '.',
-        ]))
-      self.handle.write("\t")
-      if hasattr(feature,"attributes"):
-        for k,v in feature.attributes.items():
-          self.handle.write("%s=%s;" % (k,v))
-      self.handle.write("\n")
-
-    def write_file(self, features): # should be in a superclass...
-      written = 0
-      for feature in features:
-        self.write_feature(feature)
-        written += 1
-      return written
-
-
-     
+      record = BEDRecord(*fields)
+    except (TypeError,ValueError,KeyError):
+      raise ValueError('Problem with line %d in %s.  Line was\n%s' %
+        (line_no,getattr(handle,'name',handle),line))
+    yield record
+
+#This is a generator function!
+def BEDIterator(handle):
+  """Generator function to iterate over BED features (as SeqFeature objects).
+
+  handle - input file
+
+  The blocks of BED12 lines become sub_features of type 'exon'. Use
+  BEDRecordIterator to skip the construction of SeqFeature objects.
+  """
+  for record in BEDRecordIterator(handle):
+    yield record.to_seqfeature()
+
+def _format_score(score):
+  if score is None or score == '.':
+    return '0'
+  try:
+    return str(int(round(float(score))))
+  except (TypeError,ValueError):
+    return str(score)
+
+class BEDWriter(FeatureWriter):
+    """Class to write BED format files.
+
+    BEDRecords are written with the columns they were read with. SeqFeatures
+    are written as BED12 lines when they have sub_features (the blocks)
+    and as BED6 lines otherwise.
+    """
+    def _format_record(self, record):
+      block_sizes = record._block_sizes
+      block_starts = record._block_starts
+      if isinstance(block_sizes,list):
+        block_sizes = ','.join(str(x) for x in block_sizes)
+      if isinstance(block_starts,list):
+        block_starts = ','.join(str(x) for x in block_starts)
+      thick_end = record.thick_end
+      if thick_end is not None:
+        thick_end += 1
+      fields = [record.ref,str(record.start),str(record.end+1),
+                record.name,record.score,_strand_symbols[record.strand],
+                str(record.thick_start),str(thick_end),record.item_rgb,
+                str(record.block_count),block_sizes,block_starts]
+      return '\t'.join(fields[:record.columns] + list(record.extra)) + '\n'
+
+    def format_feature(self, feature):
+      """Return the BED line of a single feature."""
+      if isinstance(feature,BEDRecord):
+        return self._format_record(feature)
+      start = int(feature.location.nofuzzy_start)
+      end = int(feature.location.nofuzzy_end)
+      name = getattr(feature,'name',None) or getattr(feature,'id',None) or '.'
+      fields = [feature.ref,str(start),str(end+1),name,
+                _format_score(getattr(feature,'score',None)),
+                _strand_symbols[feature.strand]]
+      blocks = getattr(feature,'sub_features',None)
+      if blocks:
+        blocks = sorted((int(b.location.nofuzzy_start),int(b.location.nofuzzy_end))
+                        for b in blocks)
+        thick_start = getattr(feature,'thick_start',start)
+        thick_end = getattr(feature,'thick_end',end)
+        fields += [str(thick_start),str(thick_end+1),
+                   getattr(feature,'item_rgb','0'),str(len(blocks)),
+                   ','.join(str(e-s+1) for s,e in blocks),
+                   ','.join(str(s-start) for s,e in blocks)]
+      return '\t'.join(fields) + '\n'
@@ -0,0 +1,199 @@
+"""Columnar loading of GFF3 and GTF files into NumPy arrays.
+
+read_columns returns a FeatureTable: one array per column instead of one
+SeqFeature per line.
+
+>>> table = read_columns(open('genes.gff3'), 'gff3')
+>>> exons = table[table.mask(type='exon', strand=1)]
+>>> lengths = exons.end - exons.start + 1
+
+The ref, source and type columns are categorical: int32 codes into the
+refs, sources and types lists. start and end are int64 and follow the
+coordinates of the corresponding SeqFeatureIO iterator, strand is int8
+(1, -1, 0), score is float64 (NaN for '.') and phase is int8 (-1 for '.').
+The attribute column is kept as the raw text of each line and parsed
+only when a key is asked for through attribute().
+"""
+
+import array
+
+import numpy as np
+
+from GFF3IO import parse_attributes as _parse_gff3_attributes
+from GFF3IO import _gff3_strand_to_numeric as _strand_to_numeric
+from GTFIO import parse_attributes as _parse_gtf_attributes
+from GTFIO import extract_attribute as _extract_gtf_attribute
+
+def _extract_gff3_attribute(text, key):
+    return _parse_gff3_attributes(text).get(key)
+
+# format: (offset added to the file start, offset added to the file end,
+#          attribute parser, single attribute extractor)
+_formats = {'gff3': (-1, -1, _parse_gff3_attributes, _extract_gff3_attribute),
+            'gtf': (0, 0, _parse_gtf_attributes, _extract_gtf_attribute),
+            }
+
+_strand_symbols = np.array(['-', '.', '+'], dtype=object)
+
+def _as_ndarray(values):
+    return np.frombuffer(values, dtype=values.typecode)
+
+class FeatureTable(object):
+    """A struct-of-arrays table of annotation features."""
+    _row_columns = ('ref', 'source', 'type', 'start', 'end', 'strand',
+                    'score', 'phase')
+
+    def __init__(self, format, refs, sources, types, columns, attributes):
+        self.format = format
+        self.refs = refs
+        self.sources = sources
+        self.types = types
+        for name in self._row_columns:
+            setattr(self, name, columns[name])
+        self.attributes = attributes
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, rows):
+        """Select rows with a boolean mask, an index array or a slice."""
+        if isinstance(rows, slice):
+            rows = np.arange(len(self))[rows]
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        columns = dict((name, getattr(self, name)[rows])
+                       for name in self._row_columns)
+        attributes = [self.attributes[i] for i in rows]
+        return FeatureTable(self.format, self.refs, self.sources, self.types,
+                            columns, attributes)
+
+    def codes(self, column, values):
+        """Return the codes of the given ref, source or type names."""
+        categories = getattr(self, column + 's')
+        return [categories.index(v) for v in values if v in categories]
+
+    def mask(self, ref=None, source=None, type=None, strand=None):
+        """Return a boolean mask of the rows matching every given filter.
+        ref, source and type accept a name or a collection of names."""
+        mask = np.ones(len(self), dtype=bool)
+        for column, values in (('ref', ref), ('source', source),
+                               ('type', type)):
+            if values is None:
+                continue
+            if isinstance(values, basestring):
+                values = [values]
+            mask &= np.isin(getattr(self, column), self.codes(column, values))
+        if strand is not None:
+            mask &= self.strand == _strand_to_numeric.get(strand, strand)
+        return mask
+
+    def sorted_order(self):
+        """Return the row order sorting the table by ref name, then start,
+        then end."""
+        ref_rank = np.argsort(np.argsort(self.refs, kind='mergesort'))
+        return np.lexsort((self.end, self.start, ref_rank[self.ref]))
+
+    def groups(self, column):
+        """Yield (name, row indices) for each value of the ref, source or
+        type column present in the table."""
+        codes = getattr(self, column)
+        order = np.argsort(codes, kind='mergesort')
+        present, starts = np.unique(codes[order], return_index=True)
+        bounds = list(starts) + [len(order)]
+        categories = getattr(self, column + 's')
+        for i, code in enumerate(present):
+            yield categories[code], order[bounds[i]:bounds[i+1]]
+
+    def row_attributes(self, i):
+        """Return the parsed attributes of row i as a dict."""
+        return _formats[self.format][2](self.attributes[i])
+
+    def format_columns(self):
+        """Return the ref, source, type, start, end, score, strand and phase
+        columns as lists of strings, formatted as the SeqFeatureIO writers
+        print them, converting each column with array operations."""
+        score = np.empty(len(self), dtype=object)
+        score[:] = '.'
+        known = ~np.isnan(self.score)
+        integral = known & (self.score == np.floor(np.where(known, self.score, 0)))
+        score[integral] = self.score[integral].astype(np.int64).astype(str)
+        fractional = known & ~integral
+        score[fractional] = np.char.mod('%0.3f', self.score[fractional])
+        phase = np.empty(len(self), dtype=object)
+        phase[:] = '.'
+        phased = self.phase >= 0
+        phase[phased] = self.phase[phased].astype(str)
+        return [np.array(self.refs, dtype=object)[self.ref].tolist(),
+                np.array(self.sources, dtype=object)[self.source].tolist(),
+                np.array(self.types, dtype=object)[self.type].tolist(),
+                (self.start + 1).astype(str).tolist(),
+                (self.end + 1).astype(str).tolist(),
+                score.tolist(),
+                _strand_symbols[self.strand + 1].tolist(),
+                phase.tolist()]
+
+    def attribute(self, key, default=None):
+        """Return an object array holding attribute key of every row."""
+        extract = _formats[self.format][3]
+        values = np.empty(len(self), dtype=object)
+        for i, text in enumerate(self.attributes):
+            value = extract(text, key)
+            values[i] = default if value is None else value
+        return values
+
+def read_columns(handle, format):
+    """Load a whole GFF3 or GTF file into a FeatureTable.
+
+    handle - input file
+    format - 'gff3' or 'gtf'
+    """
+    if format not in _formats:
+        raise ValueError("Unknown format '%s'" % format)
+    start_offset, end_offset = _formats[format][:2]
+    ref_codes = {}
+    source_codes = {}
+    type_codes = {}
+    ref = array.array('i')
+    source = array.array('i')
+    type = array.array('i')
+    start = array.array('l')
+    end = array.array('l')
+    strand = array.array('b')
+    score = array.array('d')
+    phase = array.array('b')
+    attributes = []
+    nan = float('nan')
+
+    line_no = 0
+    for line in handle:
+        line_no += 1
+        if line[0] == '#' or not line.strip():
+            continue
+        try:
+            (ref_name, source_name, type_name, start_text, end_text,
+             score_text, strand_text, phase_text, attribute_text) = \
+                line.strip().split('\t')
+            ref.append(ref_codes.setdefault(ref_name, len(ref_codes)))
+            source.append(source_codes.setdefault(source_name,
+                                                  len(source_codes)))
+            type.append(type_codes.setdefault(type_name, len(type_codes)))
+            start.append(int(start_text) + start_offset)
+            end.append(int(end_text) + end_offset)
+            strand.append(_strand_to_numeric[strand_text])
+            score.append(nan if score_text == '.' else float(score_text))
+            phase.append(-1 if phase_text == '.' else int(phase_text))
+        except (ValueError, KeyError):
+            raise ValueError('Problem with line %d in %s.  Line was\n%s' %
+                             (line_no, getattr(handle, 'name', handle), line))
+        attributes.append(attribute_text)
+
+    def category_list(codes):
+        return sorted(codes, key=codes.get)
+    columns = {'ref': ref, 'source': source, 'type': type, 'start': start,
+               'end': end, 'strand': strand, 'score': score, 'phase': phase}
+    columns = dict((name, _as_ndarray(values))
+                   for name, values in columns.items())
+    return FeatureTable(format, category_list(ref_codes),
+                        category_list(source_codes), category_list(type_codes),
+                        columns, attributes)
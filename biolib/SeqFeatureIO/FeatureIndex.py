@@ -0,0 +1,132 @@
+"""Random access to the features of a file by key.
+
+A FeatureIndex records the byte offset of every feature line under its
+key in a single scan and parses lines only when their key is looked up,
+the counterpart of SeqFeatureIO.to_dict that Bio.SeqIO.index is to
+Bio.SeqIO.to_dict. Like to_dict, it maps each key to the list of features
+sharing it.
+
+The offsets are kept in a dict, or, when a database filename is given, in
+an SQLite table that later runs reuse as long as the indexed file has not
+changed (same path, size and modification time). The key function is not
+recorded, so delete the database after changing it.
+"""
+
+import os
+import sqlite3
+
+_BATCH_SIZE = 10000
+
+class FeatureIndex(object):
+    def __init__(self, filename, iterator, key_function, db=None, format=None):
+        self.filename = filename
+        self.iterator = iterator
+        self.handle = open(filename, 'rb')
+        self._offsets = None
+        self._db = None
+        if db is None:
+            self._offsets = {}
+            for key, offset in self._scan(key_function):
+                self._offsets.setdefault(key, []).append(offset)
+        else:
+            self._open_db(db, key_function, format)
+
+    def _scan(self, key_function):
+        offset = 0
+        for line in self.handle:
+            line_offset = offset
+            offset += len(line)
+            if line[:1] == b'#' or not line.strip():
+                continue
+            feature = self._parse(line)
+            if feature is None:
+                continue
+            key = key_function(feature)
+            if key is not None:
+                yield key, line_offset
+
+    def _parse(self, line):
+        if str is not bytes:
+            line = line.decode('utf-8')
+        # None for lines the iterator skips (e.g. BED track lines)
+        return next(self.iterator(iter([line])), None)
+
+    def _signature(self, format):
+        stat = os.stat(self.filename)
+        return {'filename': os.path.abspath(self.filename),
+                'size': str(stat.st_size),
+                'mtime': repr(stat.st_mtime),
+                'format': str(format)}
+
+    def _open_db(self, db, key_function, format):
+        self._db = sqlite3.connect(db)
+        signature = self._signature(format)
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta '
+                         '(key TEXT PRIMARY KEY, value TEXT)')
+        stored = dict(self._db.execute('SELECT key, value FROM meta'))
+        if stored == signature:
+            return
+
+        self._db.execute('DROP TABLE IF EXISTS offsets')
+        self._db.execute('DELETE FROM meta')
+        self._db.execute('CREATE TABLE offsets (key TEXT, offset INTEGER)')
+        batch = []
+        for key, offset in self._scan(key_function):
+            batch.append((key, offset))
+            if len(batch) == _BATCH_SIZE:
+                self._db.executemany('INSERT INTO offsets VALUES (?, ?)', batch)
+                batch = []
+        self._db.executemany('INSERT INTO offsets VALUES (?, ?)', batch)
+        self._db.execute('CREATE INDEX offsets_key ON offsets (key)')
+        self._db.executemany('INSERT INTO meta VALUES (?, ?)',
+                             signature.items())
+        self._db.commit()
+
+    def offsets(self, key):
+        """Return the byte offsets of the lines filed under key."""
+        if self._db is None:
+            return self._offsets.get(key, [])
+        return [row[0] for row in self._db.execute(
+            'SELECT offset FROM offsets WHERE key = ? ORDER BY offset', (key,))]
+
+    def __getitem__(self, key):
+        offsets = self.offsets(key)
+        if not offsets:
+            raise KeyError(key)
+        features = []
+        for offset in offsets:
+            self.handle.seek(offset)
+            features.append(self._parse(self.handle.readline()))
+        return features
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if self._db is None:
+            return key in self._offsets
+        return self._db.execute('SELECT 1 FROM offsets WHERE key = ? LIMIT 1',
+                                (key,)).fetchone() is not None
+
+    def keys(self):
+        if self._db is None:
+            return list(self._offsets)
+        return [row[0] for row in
+                self._db.execute('SELECT DISTINCT key FROM offsets')]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        if self._db is None:
+            return len(self._offsets)
+        return self._db.execute(
+            'SELECT COUNT(DISTINCT key) FROM offsets').fetchone()[0]
+
+    def close(self):
+        self.handle.close()
+        if self._db is not None:
+            self._db.close()
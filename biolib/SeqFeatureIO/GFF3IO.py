@@ -3,120 +3,161 @@ Taken from FastaIO"""
 
 from Bio.SeqFeature import SeqFeature,FeatureLocation
 
+from Interfaces import FeatureWriter
+
 _gff3_strand_to_numeric = { '+': 1, '-': -1, '.': 0}
 _numeric_to_gff3_strand = { '1': '+', '-1': '-', '0': '.' }
+_strand_symbols = { 1: '+', -1: '-', 0: '.', None: '.' }
+
+def parse_attributes(text):
+  """Parse a GFF3 attribute column into a dict."""
+  return dict(pair.split("=",1) for pair in text.strip(";").split(";") if pair)
+
+def _format_score(score):
+  if score is None:
+    return '.'
+  try:
+    if int(score) == score:
+      return str(int(score))
+  except (TypeError,ValueError):
+    return str(score)
+  if isinstance(score,float):
+    return '%0.3f' % score
+  return str(score)
+
+class GFF3Record(object):
+  """A single GFF3 line split into its columns, without building a SeqFeature.
+
+  The coordinates follow the SeqFeatures produced by GFF3Iterator (start
+  and end both shifted to 0-base), strand is numeric and score and phase
+  are kept as the raw column text. The attribute column is only parsed
+  into a dict when attributes, id or name is first accessed, and
+  to_seqfeature() builds the equivalent SeqFeature on demand.
+  """
+  __slots__ = ('ref','source','type','start','end','score','strand','phase',
+               '_attribute_text','_attributes')
+
+  def __init__(self,ref,source,type,start,end,score,strand,phase,attributes):
+    self.ref = ref
+    self.source = source
+    self.type = type
+    self.start = int(start)-1 # gff3=1-base  SeqFeature=0-base
+    self.end = int(end)-1
+    self.score = score
+    self.strand = _gff3_strand_to_numeric[strand]
+    self.phase = phase
+    self._attribute_text = attributes
+    self._attributes = None
+
+  def __getstate__(self):
+    return [getattr(self,slot) for slot in self.__slots__]
+
+  def __setstate__(self,state):
+    for slot,value in zip(self.__slots__,state):
+      setattr(self,slot,value)
+
+  @property
+  def attributes(self):
+    if self._attributes is None:
+      self._attributes = parse_attributes(self._attribute_text)
+    return self._attributes
+
+  @property
+  def id(self):
+    return self.attributes.get("ID",None)
+
+  @property
+  def name(self):
+    return self.attributes.get("Name",None)
+
+  @property
+  def ref_db(self):
+    return self.source
+
+  @property
+  def location(self):
+    return FeatureLocation(self.start,self.end)
+
+  def to_seqfeature(self):
+    result = SeqFeature(location=FeatureLocation(self.start,self.end),
+      type=self.type,strand=self.strand,ref=self.ref,ref_db=self.source)
+    result.id = self.id
+    result.name = self.name
+    result.attributes = self.attributes # not an official property of SeqFeature.
+    return result
 
 #This is a generator function!
-def GFF3Iterator(handle):
-  """Generator function to iterate over Fasta records (as SeqRecord objects).
+def GFF3RecordIterator(handle):
+  """Generator function to iterate over GFF3 lines as GFF3Record objects.
 
   handle - input file
 
-  If this is not given, then the entire title line will be used
-  as the description, and the first word as the id and name.
-
-  Note that use of title2ids matches that of Bio.Fasta.SequenceParser
-  but the defaults are slightly different.
+  Comment, directive and blank lines are skipped.
   """
   line_no = 0
-  #Skip any text before the first record (e.g. blank lines, comments)
   for line in handle:
-    line = line.strip()
     line_no += 1
-    if  len(line) == 0 or line[0] == "#":
+    if line[0] == "#" or not line.strip():
       continue
+    fields = line.strip().split("\t")
     try:
-      ref,source,type,start,end,score,strand,frame,attributes = \
-        line.split("\t")
-    except:
-      raise ValueError, "Problem with line %d in %s.  Line was\n%s" %\
-        (line_no,handle.name,line)
+      record = GFF3Record(*fields)
+    except (TypeError,ValueError,KeyError):
+      raise ValueError("Problem with line %d in %s.  Line was\n%s" %
+        (line_no,getattr(handle,"name",handle),line))
+    yield record
 
-    attr_pairs = attributes.strip(';').split(";")
-    try:
-        attr_dict = dict(map(lambda x: tuple(x.split("=")), attr_pairs))
-    except:
-        print attr_pairs
-        raise
-    # gff3=1-base  SeqFeature=0-base
-    result = SeqFeature(location=FeatureLocation(int(start)-1,int(end)-1),
-      type=type,strand=_gff3_strand_to_numeric[strand],ref=ref,ref_db=source)
-    result.id = attr_dict.get("ID",None)
-    result.name = attr_dict.get("Name",None)
-    result.attributes = attr_dict # not an official property of SeqFeature.
-    yield result
-
-class GFF3Writer:
-    """Class to write Fasta format files."""
-    def __init__(self, handle):
-        """Create a Fasta writer.
-
-        handle - Handle to an output file, e.g. as returned
-                 by open(filename, "w")
-        You can either use:
-
-        myWriter = FastaWriter(open(filename,"w"))
-        writer.write_file(myRecords)
-
-        Or, follow the sequential file writer system, for example:
-
-        myWriter = FastaWriter(open(filename,"w"))
-        writer.write_header() # does nothing for Fasta files
-        ...
-        Multiple calls to writer.write_record() and/or writer.write_records()
-        ...
-        writer.write_footer() # does nothing for Fasta files
-        writer.close()
-        """
-        self.handle = handle
-        self._header_written = False
-        self._feature_written = False
+#This is a generator function!
+def GFF3Iterator(handle):
+  """Generator function to iterate over GFF3 features (as SeqFeature objects).
+
+  handle - input file
+
+  Use GFF3RecordIterator to skip the construction of SeqFeature objects.
+  """
+  for record in GFF3RecordIterator(handle):
+    yield record.to_seqfeature()
 
+class GFF3Writer(FeatureWriter):
+    """Class to write GFF3 format files."""
     def write_header(self):
       self.handle.write("##gff-version 3\n")
       self._header_written = True
 
-    def write_feature(self, feature):
-      """Write a single GFF3 feature to the file."""
-      if not self._header_written:
-        self.write_header()
-      self._feature_written = True
-      
-      source = getattr(feature,"ref_db","Unknown") or 'Unknown'
-      try:
-          if int(feature.score) == feature.score:
-              score = str(int(feature.score))
-          elif isinstance(feature.score,float):
-              score = '%0.3f' % feature.score
-          else:
-              score = str(feature.score)
-      except AttributeError:
-          score = '.'
-      except TypeError:
-          score = str(feature.score)
-
-      self.handle.write("\t".join([
+    def format_feature(self, feature):
+      """Return the GFF3 line of a single feature."""
+      if isinstance(feature,GFF3Record):
+        start = feature.start
+        end = feature.end
+        if feature._attributes is None:
+          attributes = feature._attribute_text
+        else:
+          attributes = "".join("%s=%s;" % kv for kv in feature._attributes.items())
+      else:
+        start = int(feature.location.nofuzzy_start)
+        end = int(feature.location.nofuzzy_end)
+        if hasattr(feature,"attributes"):
+          attributes = "".join("%s=%s;" % kv for kv in feature.attributes.items())
+        else:
+          attributes = ""
+      return "\t".join([
         feature.ref,
-        source,
+        getattr(feature,"ref_db","Unknown") or 'Unknown',
         feature.type,
-        str(int(feature.location.nofuzzy_start+1)), # gff3=1-base  SeqFeature=0-base
-        str(int(feature.location.nofuzzy_end+1)),
-        score,
-        _numeric_to_gff3_strand[str(feature.strand)],
+        str(start+1), # gff3=1-base  SeqFeature=0-base
+        str(end+1),
+        _format_score(getattr(feature,"score",None)),
+        _strand_symbols[feature.strand],
         getattr(feature,'phase','.') or '.',
-        ]))
-      self.handle.write("\t")
-      if hasattr(feature,"attributes"):
-        for k,v in feature.attributes.items():
-          self.handle.write("%s=%s;" % (k,v))
-      self.handle.write("\n")
-
-    def write_file(self, features): # should be in a superclass...
-      written = 0
-      for feature in features:
-        self.write_feature(feature)
-        written += 1
-      return written
-
-
-     
+        attributes,
+        ]) + "\n"
+
+    def format_table(self, table):
+      """Return the GFF3 lines of the rows of a Columns.FeatureTable."""
+      columns = table.format_columns()
+      if table.format == 'gff3':
+        attributes = table.attributes
+      else:
+        attributes = ["".join("%s=%s;" % kv for kv in table.row_attributes(i).items())
+                      for i in range(len(table))]
+      return ["\t".join(row) + "\n" for row in zip(*(columns + [attributes]))]
@@ -1,115 +1,201 @@
-"""Supplement the missing support for GFF3 from biopython.
+"""Supplement the missing support for GTF from biopython.
 Taken from FastaIO"""
 
-import re
+try:
+  from collections.abc import MutableMapping
+except ImportError:
+  from collections import MutableMapping
+
 from Bio.SeqFeature import SeqFeature,FeatureLocation
 
+from Interfaces import FeatureWriter
+
 _gff3_strand_to_numeric = { '+': 1, '-': -1, '.': 0}
 _numeric_to_gff3_strand = { '1': '+', '-1': '-', '0': '.' }
+_strand_symbols = { 1: '+', -1: '-', 0: '.', None: '.' }
+
+# attribute values repeated across most lines of a file, e.g. Ensembl's
+_repetitive_keys = set(['gene_biotype','gene_source','gene_type',
+                        'transcript_biotype','transcript_source',
+                        'transcript_type','source','tag','level',
+                        'transcript_support_level','exon_number'])
+
+def parse_attributes(text, keys=None):
+  """Parse a GTF attribute column into a dict.
+
+  keys - if given, only these keys are extracted, each with a direct search
+         of the column text instead of a full parse.
+
+  Keys and the values of repetitive keys (biotypes, sources, ...) are
+  interned.
+  """
+  if keys is not None:
+    attributes = {}
+    for key in keys:
+      value = extract_attribute(text,key)
+      if value is not None:
+        attributes[key] = value
+    return attributes
+
+  attributes = {}
+  for pair in text.split(';'):
+    pair = pair.strip()
+    if not pair:
+      continue
+    key,sep,value = pair.partition(' ')
+    if not sep:
+      # a bare value is taken as the transcript_id
+      attributes['transcript_id'] = pair
+      continue
+    key = intern(key)
+    value = value.strip('"')
+    if key in _repetitive_keys:
+      value = intern(value)
+    attributes[key] = value
+  return attributes
+
+def _starts_pair(text, i):
+  # whether a key at position i starts an attribute: at the start of the
+  # column or after a ';' (and spaces), outside of any quoted value
+  j = i - 1
+  while j >= 0 and text[j] in ' \t':
+    j -= 1
+  return (j < 0 or text[j] == ';') and text.count('"',0,i) % 2 == 0
+
+def extract_attribute(text, key):
+  """Return the value of a single attribute of a GTF attribute column, or
+  None, without parsing the other attributes."""
+  pattern = key + ' '
+  i = text.find(pattern)
+  # skip matches that are not at the start of a pair (e.g. inside values)
+  while i >= 0 and not _starts_pair(text,i):
+    i = text.find(pattern,i+1)
+  if i < 0:
+    return None
+  start = i + len(pattern)
+  end = text.find(';',start)
+  if end < 0:
+    end = len(text)
+  value = text[start:end].strip().strip('"')
+  if key in _repetitive_keys:
+    value = intern(value)
+  return value
+
+class GTFAttributes(MutableMapping):
+  """The attributes of a GTF line, parsed from the column text on first use.
+
+  get() of a single key before any other access is answered with
+  extract_attribute(), so reading e.g. only transcript_id never builds the
+  full dict.
+  """
+  def __init__(self, text):
+    self.text = text
+    self._dict = None
+
+  @property
+  def parsed(self):
+    return self._dict is not None
+
+  def _attributes(self):
+    if self._dict is None:
+      self._dict = parse_attributes(self.text)
+    return self._dict
+
+  def get(self, key, default=None):
+    if self._dict is None:
+      value = extract_attribute(self.text,key)
+      if value is not None:
+        return value
+      if ' ' in self.text.strip():
+        return default
+    return self._attributes().get(key,default)
+
+  def __getitem__(self, key):
+    return self._attributes()[key]
+
+  def __setitem__(self, key, value):
+    self._attributes()[key] = value
+
+  def __delitem__(self, key):
+    del self._attributes()[key]
+
+  def __contains__(self, key):
+    return key in self._attributes()
+
+  def __iter__(self):
+    return iter(self._attributes())
+
+  def __len__(self):
+    return len(self._attributes())
+
+  def __repr__(self):
+    return repr(self._attributes())
 
 #This is a generator function!
-def GTFIterator(handle):
-  """Generator function to iterate over Fasta records (as SeqRecord objects).
+def GTFIterator(handle, keys=None):
+  """Generator function to iterate over GTF features (as SeqFeature objects).
 
   handle - input file
+  keys   - if given, only these attributes are extracted, into a plain
+           dict; otherwise attributes is a GTFAttributes object parsed on
+           first access.
 
-  If this is not given, then the entire title line will be used
-  as the description, and the first word as the id and name.
-
-  Note that use of title2ids matches that of Bio.Fasta.SequenceParser
-  but the defaults are slightly different.
+  The ref, source and type columns are interned.
   """
   line_no = 0
-  #Skip any text before the first record (e.g. blank lines, comments)
-  while True :
+  for line in handle:
     line_no += 1
-    line = handle.next()
-    if line is None:
-      return
-    line = line.strip()
-    if len(line) == 0 or line[0] == '#':
+    if line[0] == '#' or not line.strip():
       continue
     try:
       ref,source,type,start,end,score,strand,frame,attributes = \
-        line.split('\t')
-    except:
-      raise ValueError, 'Problem with line %d in %s.  Line was\n%s' %\
-        (line_no,handle.name,line)
-
-    attr_pairs = attributes.strip(';').split(';')
-    attr_dict = {}
-    for pair in attr_pairs:
-        try:
-            key,value = pair.strip().split(' ',1)
-            value = value.strip('"')
-            attr_dict[key] = value
-        except:
-            attr_dict['transcript_id']=pair
-            
-
-    #attr_dict = dict(map(lambda x: tuple([y.strip('"') 
-                                          #for y in x.split(' ',1)]), attr_pairs))
-    result = SeqFeature(location=FeatureLocation(int(start),int(end)),
-      type=type,strand=_gff3_strand_to_numeric[strand],ref=ref,ref_db=source)
-    result.name = result.id = attr_dict.get('transcript_id',None)
-    result.attributes = attr_dict # not an official property of SeqFeature.
+        line.strip().split('\t')
+      strand = _gff3_strand_to_numeric[strand]
+      location = FeatureLocation(int(start),int(end))
+    except (ValueError,KeyError):
+      raise ValueError('Problem with line %d in %s.  Line was\n%s' %
+        (line_no,getattr(handle,'name',handle),line))
+
+    if keys is None:
+      attributes = GTFAttributes(attributes)
+    else:
+      attributes = parse_attributes(attributes,keys)
+    result = SeqFeature(location=location,type=intern(type),strand=strand,
+      ref=intern(ref),ref_db=intern(source))
+    result.name = result.id = attributes.get('transcript_id',None)
+    result.attributes = attributes # not an official property of SeqFeature.
     result.frame = frame
     yield result
 
-class GTFWriter:
-    """Class to write Fasta format files."""
-    def __init__(self, handle):
-        """Create a Fasta writer.
-
-        handle - Handle to an output file, e.g. as returned
-                 by open(filename, "w")
-        You can either use:
-
-        myWriter = FastaWriter(open(filename,"w"))
-        writer.write_file(myRecords)
-
-        Or, follow the sequential file writer system, for example:
-
-        myWriter = FastaWriter(open(filename,"w"))
-        writer.write_header() # does nothing for Fasta files
-        ...
-        Multiple calls to writer.write_record() and/or writer.write_records()
-        ...
-        writer.write_footer() # does nothing for Fasta files
-        writer.close()
-        """
-        self.handle = handle
-        self._header_written = False
-        self._feature_written = False
-
-    def write_header(self):
-      self._header_written = True
-
-    def write_feature(self, feature):
-      """Write a single GFF3 feature to the file."""
-      if not self._header_written:
-          self.write_header()
-      self._feature_written = True
-      source = getattr(feature,"ref_db","Unknown") 
-      self.handle.write("\t".join([
+class GTFWriter(FeatureWriter):
+    """Class to write GTF format files."""
+    def format_feature(self, feature):
+      """Return the GTF line of a single feature."""
+      if isinstance(getattr(feature,"attributes",None),GTFAttributes) and \
+          not feature.attributes.parsed:
+        attributes = feature.attributes.text
+      elif hasattr(feature,"attributes"):
+        attributes = "".join('%s "%s"; ' % kv for kv in feature.attributes.items())
+      else:
+        attributes = ""
+      return "\t".join([
         feature.ref,
-        source,
+        getattr(feature,"ref_db","Unknown"),
         feature.type,
         str(int(feature.location.nofuzzy_start)+1), # gff3=1-base  SeqFeature=0-base
         str(int(feature.location.nofuzzy_end)+1),
         str(getattr(feature,"score",".") or '.'),
-        _numeric_to_gff3_strand[str(feature.strand)],
+        _strand_symbols[feature.strand],
         getattr(feature,"phase",".") or '.',
-        ]))
-      self.handle.write("\t")
-      if hasattr(feature,"attributes"):
-          for k,v in feature.attributes.items():
-              self.handle.write('%s "%s"; ' % (k,v))
-      self.handle.write("\n")
-
-    def write_file(self, features): # should be in a superclass...
-      written = 0
-      for feature in features:
-        self.write_feature(feature)
-        written += 1
-      return written
+        attributes,
+        ]) + "\n"
+
+    def format_table(self, table):
+      """Return the GTF lines of the rows of a Columns.FeatureTable."""
+      columns = table.format_columns()
+      if table.format == 'gtf':
+        attributes = table.attributes
+      else:
+        attributes = ["".join('%s "%s"; ' % kv for kv in table.row_attributes(i).items())
+                      for i in range(len(table))]
+      return ["\t".join(row) + "\n" for row in zip(*(columns + [attributes]))]
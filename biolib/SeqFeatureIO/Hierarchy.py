@@ -0,0 +1,116 @@
+"""Parent/child hierarchy of GFF3 features.
+
+FeatureHierarchy reads a stream of GFF3 features once, indexing them by
+their ID attribute and filing every feature under the IDs listed in its
+Parent attribute. Children are filed by their parent's ID rather than the
+parent itself, so children that appear before their parent are resolved as
+soon as the parent is read, without a second pass:
+
+>>> hierarchy = FeatureHierarchy(SeqFeatureIO.parse(open('genes.gff3'), 'gff3'))
+>>> for gene in hierarchy.roots('gene'):
+...     for mrna in hierarchy.transcripts(gene):
+...         exons = hierarchy.children(mrna, 'exon')
+
+Both SeqFeatures and GFF3Records ('gff3-record' format) may be indexed.
+"""
+
+class FeatureHierarchy(object):
+    def __init__(self, features):
+        self.features = []
+        self._by_id = {}
+        self._children = {}
+        self._roots = []
+        for feature in features:
+            self.add(feature)
+
+    def add(self, feature):
+        """Index a single feature."""
+        self.features.append(feature)
+        id = feature.attributes.get('ID')
+        if id is not None:
+            if id in self._by_id:
+                # multi-line features (e.g. CDS) share their ID
+                self._by_id[id].append(feature)
+            else:
+                self._by_id[id] = [feature]
+        parents = feature.attributes.get('Parent')
+        if parents is None:
+            self._roots.append(feature)
+        else:
+            for parent in parents.split(','):
+                self._children.setdefault(parent, []).append(feature)
+
+    def get(self, id):
+        """Return the (first) feature with the given ID, or None."""
+        features = self._by_id.get(id)
+        return features[0] if features else None
+
+    def get_all(self, id):
+        """Return every line of the feature with the given ID."""
+        return list(self._by_id.get(id, []))
+
+    def __contains__(self, id):
+        return id in self._by_id
+
+    def __len__(self):
+        return len(self.features)
+
+    def _id(self, feature):
+        if isinstance(feature, basestring):
+            return feature
+        return feature.attributes.get('ID')
+
+    def children(self, feature, types=None):
+        """Return the direct children of a feature (or of an ID), in file
+        order. types restricts the result to a feature type or a collection
+        of types."""
+        children = self._children.get(self._id(feature), [])
+        return _of_types(children, types)
+
+    def parents(self, feature):
+        """Return the parent features of a feature, skipping Parent IDs that
+        no feature of the stream defines."""
+        parents = feature.attributes.get('Parent')
+        if parents is None:
+            return []
+        return [self._by_id[id][0] for id in parents.split(',')
+                if id in self._by_id]
+
+    def descendants(self, feature, types=None):
+        """Return all features below a feature in depth-first file order,
+        each once even when reachable through several parents."""
+        result = []
+        seen = set()
+        stack = list(reversed(self.children(feature)))
+        while stack:
+            child = stack.pop()
+            if id(child) in seen:
+                continue
+            seen.add(id(child))
+            result.append(child)
+            stack.extend(reversed(self._children.get(self._id(child), [])))
+        return _of_types(result, types)
+
+    def roots(self, types=None):
+        """Return the features without a Parent attribute."""
+        return _of_types(self._roots, types)
+
+    def transcripts(self, gene, types=None):
+        """Return the transcripts of a gene: its children that have children
+        of their own, or its children of the given types."""
+        children = self.children(gene, types)
+        if types is not None:
+            return children
+        return [child for child in children if self._id(child) in self._children]
+
+    def unresolved(self):
+        """Return the Parent IDs referenced by features but never defined."""
+        return [id for id in self._children if id not in self._by_id]
+
+def _of_types(features, types):
+    if types is None:
+        return list(features)
+    if isinstance(types, basestring):
+        types = [types]
+    types = set(types)
+    return [f for f in features if f.type in types]
@@ -0,0 +1,77 @@
+"""Base class of the SeqFeatureIO writers, as Bio.SeqIO.Interfaces is for
+the SeqIO ones.
+
+A writer only has to define format_feature (and write_header if its
+format has a header); FeatureWriter writes the formatted lines in
+batches, each with a single call to the handle.
+"""
+
+class FeatureWriter(object):
+    """Base class of feature file writers.
+
+    Subclasses define format_feature(feature), returning the line of a
+    single feature, and optionally format_table(table), returning the lines
+    of the rows of a Columns.FeatureTable.
+    """
+    def __init__(self, handle):
+        """Create a writer.
+
+        handle - Handle to an output file, e.g. as returned
+                 by open(filename, "w")
+
+        Either write a whole file:
+
+        writer.write_file(features)
+
+        or call writer.write_header(), then write_feature(),
+        write_features() and/or write_table() as often as needed.
+        """
+        self.handle = handle
+        self._header_written = False
+        self._feature_written = False
+
+    def write_header(self):
+        # nothing to write for formats without a header
+        self._header_written = True
+
+    def format_feature(self, feature):
+        """Return the line of a single feature."""
+        raise NotImplementedError
+
+    def write_feature(self, feature):
+        """Write a single feature to the file."""
+        self.write_lines([self.format_feature(feature)])
+
+    def write_lines(self, lines):
+        """Write formatted lines to the file in a single call."""
+        if not self._header_written:
+            self.write_header()
+        self._feature_written = True
+        self.handle.write("".join(lines))
+
+    def write_features(self, features, batch_size=10000):
+        """Format features in batches of batch_size and write each batch
+        with a single call. Returns the number of features written."""
+        written = 0
+        lines = []
+        for feature in features:
+            lines.append(self.format_feature(feature))
+            if len(lines) == batch_size:
+                self.write_lines(lines)
+                written += len(lines)
+                lines = []
+        if lines:
+            self.write_lines(lines)
+            written += len(lines)
+        return written
+
+    def write_table(self, table, batch_size=10000):
+        """Write the rows of a Columns.FeatureTable, formatting each column
+        with array operations (for writers defining format_table). Returns
+        the number of rows written."""
+        for first in range(0, len(table), batch_size):
+            self.write_lines(self.format_table(table[first:first+batch_size]))
+        return len(table)
+
+    def write_file(self, features):
+        return self.write_features(features)
@@ -0,0 +1,180 @@
+"""Sweep-line set operations over coordinate-sorted feature streams.
+
+The functions here take iterators of SeqFeature objects, such as those
+returned by SeqFeatureIO.parse, sorted by ref and then by start (the
+order of `sort -k1,1 -k4,4n` for GFF3). They consume their inputs once,
+keep in memory only the features that may still overlap the current
+position, and are themselves generators:
+
+>>> genes = SeqFeatureIO.parse(open('genes.sorted.gff3'), 'gff3')
+>>> peaks = SeqFeatureIO.parse(open('peaks.sorted.gtf'), 'gtf')
+>>> for gene, peak in intersect(genes, peaks):
+...     print gene.id, peak.id
+
+Coordinates are those of the feature locations, inclusive at both ends as
+in IntervalTree. A ValueError is raised as soon as an input is found not
+to be sorted.
+"""
+
+import copy
+
+from Bio.SeqFeature import SeqFeature,FeatureLocation
+
+def _sorted_items(features):
+    last = None
+    for feature in features:
+        item = (feature.ref, int(feature.location.nofuzzy_start),
+                int(feature.location.nofuzzy_end), feature)
+        if last is not None and item[:2] < last:
+            raise ValueError('Features are not sorted by ref and start: '
+                             '%s:%d follows %s:%d' % (item[:2] + last))
+        last = item[:2]
+        yield item
+
+def _new_feature(ref, start, end, strand, type):
+    result = SeqFeature(location=FeatureLocation(start,end),
+      type=type,strand=strand,ref=ref)
+    result.attributes = {}
+    return result
+
+def _relocated(feature, start, end):
+    if hasattr(feature, 'to_seqfeature'):
+        feature = feature.to_seqfeature()
+    result = copy.copy(feature)
+    result.location = FeatureLocation(start,end)
+    if hasattr(feature, 'attributes'):
+        result.attributes = dict(feature.attributes)
+    return result
+
+class _Sweep(object):
+    """A window sliding along a sorted stream.
+
+    After advance(ref, start, end) the active list holds, in stream order,
+    the features of ref that end at or after start and begin at or before
+    the largest end advanced to so far; last_before is the feature of ref
+    with the greatest end among those that ended before start.
+    """
+    def __init__(self, features):
+        self.stream = _sorted_items(features)
+        self.next = next(self.stream, None)
+        self.ref = None
+        self.active = []
+        self.last_before = None
+
+    def advance(self, ref, start, end):
+        if ref != self.ref:
+            self.ref = ref
+            self.active = []
+            self.last_before = None
+        active = []
+        for item in self.active:
+            if item[2] < start:
+                self._passed(item)
+            else:
+                active.append(item)
+        while self.next is not None and self.next[:2] <= (ref, end):
+            item = self.next
+            self.next = next(self.stream, None)
+            if item[0] != ref:
+                continue
+            if item[2] < start:
+                self._passed(item)
+            else:
+                active.append(item)
+        self.active = active
+        return active
+
+    def _passed(self, item):
+        if self.last_before is None or item[2] >= self.last_before[2]:
+            self.last_before = item
+
+def intersect(a_features, b_features):
+    """Yield an (a, b) pair for every feature a of a_features overlapping a
+    feature b of b_features, in the order of a and then of b."""
+    sweep = _Sweep(b_features)
+    for ref, start, end, a in _sorted_items(a_features):
+        for b_ref, b_start, b_end, b in sweep.advance(ref, start, end):
+            if b_start <= end:
+                yield a, b
+
+def merge(features, distance=0, type='region'):
+    """Yield one new feature of the given type for every run of features
+    that overlap or are at most distance positions apart; bookended
+    features are merged by default. The merged feature keeps the strand of
+    its members if they all agree and is unstranded (0) otherwise."""
+    cur = None
+    for ref, start, end, feature in _sorted_items(features):
+        if cur is not None and ref == cur[0] and start - cur[2] - 1 <= distance:
+            if end > cur[2]:
+                cur[2] = end
+            if feature.strand != cur[3]:
+                cur[3] = 0
+            continue
+        if cur is not None:
+            yield _new_feature(cur[0], cur[1], cur[2], cur[3], type)
+        cur = [ref, start, end, feature.strand]
+    if cur is not None:
+        yield _new_feature(cur[0], cur[1], cur[2], cur[3], type)
+
+def subtract(a_features, b_features):
+    """Yield the parts of the features of a_features not covered by any
+    feature of b_features. Features without overlaps are yielded as they
+    are; the pieces of the others are copies of them with new locations."""
+    sweep = _Sweep(b_features)
+    for ref, start, end, a in _sorted_items(a_features):
+        pieces = []
+        cur = start
+        for b_ref, b_start, b_end, b in sweep.advance(ref, start, end):
+            if b_start > end:
+                break
+            if b_start > cur:
+                pieces.append((cur, b_start - 1))
+            if b_end + 1 > cur:
+                cur = b_end + 1
+        if cur == start:
+            yield a
+            continue
+        if cur <= end:
+            pieces.append((cur, end))
+        for piece_start, piece_end in pieces:
+            yield _relocated(a, piece_start, piece_end)
+
+def closest(a_features, b_features):
+    """Yield (a, b, distance) for every feature a of a_features and the
+    feature(s) b of b_features on the same ref nearest to it.
+
+    Overlapping features are reported with a distance of 0 and all of them
+    are yielded. Otherwise the distance is the gap between the closer ends
+    (1 for adjacent features) and both neighbours are yielded on a tie.
+    If the ref of a has no features in b_features, (a, None, None) is
+    yielded.
+    """
+    sweep = _Sweep(b_features)
+    for ref, start, end, a in _sorted_items(a_features):
+        active = sweep.advance(ref, start, end)
+        overlaps = [item for item in active if item[1] <= end]
+        if overlaps:
+            for item in overlaps:
+                yield a, item[3], 0
+            continue
+
+        candidates = []
+        if sweep.last_before is not None:
+            candidates.append((start - sweep.last_before[2],
+                               sweep.last_before[3]))
+        if active:
+            after = active[0]
+        elif sweep.next is not None and sweep.next[0] == ref:
+            after = sweep.next
+        else:
+            after = None
+        if after is not None:
+            candidates.append((after[1] - end, after[3]))
+
+        if not candidates:
+            yield a, None, None
+            continue
+        nearest = min(distance for distance, b in candidates)
+        for distance, b in candidates:
+            if distance == nearest:
+                yield a, b, distance
@@ -0,0 +1,395 @@
+"""Block-compressed (BGZF), coordinate-indexed annotation files.
+
+Files are written as BGZF, the blocked gzip variant used by samtools and
+tabix: a series of gzip members of at most 64 kb each, so any gzip reader
+can decompress them, while a virtual offset (compressed block address << 16
+| offset in the uncompressed block) can seek directly to a line. Next to
+the data file a tabix index (filename + '.tbi') is written, holding for
+every reference the UCSC binning scheme and a linear index of 16 kb
+windows, laid out as in the tabix .tbi format.
+
+Only zlib and struct from the standard library are used. The functions
+SeqFeatureIO.write_indexed and SeqFeatureIO.fetch build on this module.
+"""
+
+import struct
+import zlib
+
+_BLOCK_SIZE = 0xff00
+_MAX_BLOCK = 0x10000
+_EOF_BLOCK = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' \
+             b'\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+_LINEAR_SHIFT = 14
+
+class Preset(object):
+    """Column layout of an indexed text format, as stored in a tabix index.
+
+    flags  - tabix format code; 0x10000 marks 0-based (UCSC) begins
+    seq    - 1-based column of the reference name
+    begin  - 1-based column of the begin coordinate
+    end    - 1-based column of the end coordinate
+    meta   - prefix of lines that are not indexed
+    """
+    def __init__(self, flags, seq, begin, end, meta='#', skip=0):
+        self.flags = flags
+        self.seq = seq
+        self.begin = begin
+        self.end = end
+        self.meta = meta
+        self.skip = skip
+
+    def region(self, line):
+        """Return the (ref, begin, end) of a line, 0-based and half-open."""
+        fields = line.rstrip('\r\n').split('\t')
+        begin = int(fields[self.begin-1])
+        if not self.flags & 0x10000:
+            begin -= 1
+        end = int(fields[self.end-1])
+        if end <= begin:
+            end = begin + 1
+        return fields[self.seq-1], begin, end
+
+presets = {'gff3': Preset(0, 1, 4, 5),
+           'gtf': Preset(0, 1, 4, 5),
+           'bed': Preset(0x10000, 1, 2, 3),
+           }
+
+def _text(data):
+    # lines are handled as str on both Python 2 and 3
+    return data if str is bytes else data.decode('utf-8')
+
+def reg2bin(begin, end):
+    """Return the smallest bin containing [begin, end) (SAM specification)."""
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if begin >> shift == end >> shift:
+            return offset + (begin >> shift)
+    return 0
+
+def reg2bins(begin, end):
+    """Return every bin that may hold features overlapping [begin, end)."""
+    end -= 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (begin >> shift), offset + (end >> shift) + 1))
+    return bins
+
+def _deflate(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+class BgzfWriter(object):
+    """Write a BGZF file; tell() returns the virtual offset of the next byte."""
+    def __init__(self, filename, level=6):
+        if hasattr(filename, 'write'):
+            self.handle = filename
+        else:
+            self.handle = open(filename, 'wb')
+        self.level = level
+        # pending data, joined only once a whole block is buffered
+        self.chunks = []
+        self.buffered = 0
+        self.address = 0
+
+    def write(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        self.chunks.append(data)
+        self.buffered += len(data)
+        if self.buffered < _BLOCK_SIZE:
+            return
+        data = b''.join(self.chunks)
+        start = 0
+        while len(data) - start >= _BLOCK_SIZE:
+            self._write_block(data[start:start+_BLOCK_SIZE])
+            start += _BLOCK_SIZE
+        self.chunks = [data[start:]]
+        self.buffered = len(data) - start
+
+    def _write_block(self, data):
+        # data is at most _BLOCK_SIZE bytes, so the virtual offsets given
+        # out by tell() point into this single block
+        compressed = _deflate(data, self.level)
+        if len(compressed) + 26 > _MAX_BLOCK:
+            # incompressible data; stored uncompressed (level 0) it adds a
+            # few bytes only, which always fits in a block
+            compressed = _deflate(data, 0)
+        block = struct.pack('<4BI2BH2BHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6,
+                            ord('B'), ord('C'), 2, len(compressed) + 25) + \
+            compressed + \
+            struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+        self.handle.write(block)
+        self.address += len(block)
+
+    def tell(self):
+        return self.address << 16 | self.buffered
+
+    def flush(self):
+        if self.buffered:
+            self._write_block(b''.join(self.chunks))
+        self.chunks = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.handle.write(_EOF_BLOCK)
+        self.handle.close()
+
+class BgzfReader(object):
+    """Read a BGZF file with seeks to virtual offsets."""
+    def __init__(self, filename):
+        if hasattr(filename, 'read'):
+            self.handle = filename
+        else:
+            self.handle = open(filename, 'rb')
+        self._load(0)
+
+    def _load(self, address):
+        self.address = address
+        self.offset = 0
+        self.handle.seek(address)
+        header = self.handle.read(12)
+        if len(header) < 12:
+            self.data = b''
+            self.next_address = address
+            return
+        if header[:4] != b'\x1f\x8b\x08\x04':
+            raise ValueError('Not a BGZF block at offset %d' % address)
+        extra_length, = struct.unpack('<H', header[10:12])
+        extra = self.handle.read(extra_length)
+        block_size = None
+        i = 0
+        while i + 4 <= len(extra):
+            tag = extra[i:i+2]
+            length, = struct.unpack('<H', extra[i+2:i+4])
+            if tag == b'BC':
+                block_size = struct.unpack('<H', extra[i+4:i+6])[0] + 1
+            i += 4 + length
+        if block_size is None:
+            raise ValueError('Not a BGZF block at offset %d' % address)
+        rest = self.handle.read(block_size - 12 - extra_length)
+        self.data = zlib.decompress(rest[:-8], -15)
+        self.next_address = address + block_size
+
+    def seek(self, virtual_offset):
+        address = virtual_offset >> 16
+        if address != self.address:
+            self._load(address)
+        self.offset = virtual_offset & 0xffff
+
+    def tell(self):
+        if self.offset == len(self.data) and self.data:
+            return self.next_address << 16
+        return self.address << 16 | self.offset
+
+    def readline(self):
+        """Return the next line, or an empty string at the end of file."""
+        parts = []
+        while True:
+            if self.offset == len(self.data):
+                if not self.data or self.next_address == self.address:
+                    break
+                self._load(self.next_address)
+                continue
+            newline = self.data.find(b'\n', self.offset)
+            if newline < 0:
+                parts.append(self.data[self.offset:])
+                self.offset = len(self.data)
+                continue
+            parts.append(self.data[self.offset:newline+1])
+            self.offset = newline + 1
+            break
+        return _text(b''.join(parts))
+
+    def read(self):
+        """Return the rest of the decompressed file as bytes."""
+        parts = []
+        while True:
+            parts.append(self.data[self.offset:])
+            self.offset = len(self.data)
+            if not self.data or self.next_address == self.address:
+                break
+            self._load(self.next_address)
+        return b''.join(parts)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def close(self):
+        self.handle.close()
+
+class TabixIndex(object):
+    """Binning and linear index of a BGZF compressed, sorted text file."""
+    def __init__(self, preset):
+        self.preset = preset
+        self.names = []
+        self.bins = {}
+        self.linear = {}
+        self._last = None
+
+    def add(self, line, start, end):
+        """Index a line stored between virtual offsets start and end. Lines
+        must be added in file order, grouped by ref and sorted by begin."""
+        ref, begin, stop = self.preset.region(line)
+        if self._last is None or ref != self._last[0]:
+            if ref in self.bins:
+                raise ValueError('Lines of %s are not contiguous' % ref)
+            self.names.append(ref)
+            self.bins[ref] = {}
+            self.linear[ref] = []
+        elif begin < self._last[1]:
+            raise ValueError('Lines are not sorted: %s:%d follows %s:%d' %
+                             (ref, begin + 1, ref, self._last[1] + 1))
+        self._last = (ref, begin)
+
+        chunks = self.bins[ref].setdefault(reg2bin(begin, stop), [])
+        if chunks and chunks[-1][1] == start:
+            chunks[-1][1] = end
+        else:
+            chunks.append([start, end])
+        linear = self.linear[ref]
+        last_window = (stop - 1) >> _LINEAR_SHIFT
+        if len(linear) <= last_window:
+            linear.extend([None] * (last_window + 1 - len(linear)))
+        for window in range(begin >> _LINEAR_SHIFT, last_window + 1):
+            if linear[window] is None:
+                linear[window] = start
+
+    def chunks(self, ref, begin, end):
+        """Return the merged (start, end) virtual offset ranges that may
+        hold lines overlapping [begin, end) of ref (0-based, half-open)."""
+        if ref not in self.bins:
+            return []
+        bins = self.bins[ref]
+        linear = _filled(self.linear[ref])
+        # no line starting before this offset can reach begin
+        min_offset = linear[min(begin >> _LINEAR_SHIFT, len(linear) - 1)] \
+            if linear else 0
+        chunks = sorted(tuple(chunk) for bin in reg2bins(begin, end)
+                        for chunk in bins.get(bin, [])
+                        if chunk[1] > min_offset)
+        merged = []
+        for start, stop in chunks:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], stop)
+            else:
+                merged.append([start, stop])
+        return merged
+
+    def write(self, filename):
+        """Write the index in the tabix (.tbi) format."""
+        names = b''.join(name.encode('utf-8') + b'\0' for name in self.names)
+        data = [b'TBI\x01',
+                struct.pack('<7i', len(self.names), self.preset.flags,
+                            self.preset.seq, self.preset.begin,
+                            self.preset.end, ord(self.preset.meta),
+                            self.preset.skip),
+                struct.pack('<i', len(names)), names]
+        for name in self.names:
+            bins = self.bins[name]
+            data.append(struct.pack('<i', len(bins)))
+            for bin in sorted(bins):
+                data.append(struct.pack('<Ii', bin, len(bins[bin])))
+                for start, end in bins[bin]:
+                    data.append(struct.pack('<QQ', start, end))
+            linear = _filled(self.linear[name])
+            data.append(struct.pack('<i', len(linear)))
+            data.append(struct.pack('<%dQ' % len(linear), *linear))
+        writer = BgzfWriter(filename)
+        writer.write(b''.join(data))
+        writer.close()
+
+    @classmethod
+    def read(cls, filename):
+        """Read an index in the tabix (.tbi) format."""
+        reader = BgzfReader(filename)
+        data = reader.read()
+        reader.close()
+        if data[:4] != b'TBI\x01':
+            raise ValueError('%s is not a tabix index' % filename)
+        (n_ref, flags, seq, begin, end, meta, skip,
+         names_length) = struct.unpack('<8i', data[4:36])
+        index = cls(Preset(flags, seq, begin, end, chr(meta), skip))
+        names = data[36:36+names_length].split(b'\0')[:n_ref]
+        index.names = [_text(name) for name in names]
+        position = 36 + names_length
+        for name in index.names:
+            bins = index.bins[name] = {}
+            n_bin, = struct.unpack('<i', data[position:position+4])
+            position += 4
+            for i in range(n_bin):
+                bin, n_chunk = struct.unpack('<Ii', data[position:position+8])
+                position += 8
+                chunks = struct.unpack('<%dQ' % (2*n_chunk),
+                                       data[position:position+16*n_chunk])
+                position += 16 * n_chunk
+                bins[bin] = [list(chunks[j:j+2]) for j in range(0, len(chunks), 2)]
+            n_linear, = struct.unpack('<i', data[position:position+4])
+            position += 4
+            index.linear[name] = list(struct.unpack(
+                '<%dQ' % n_linear, data[position:position+8*n_linear]))
+            position += 8 * n_linear
+        return index
+
+def _filled(linear):
+    filled = []
+    last = 0
+    for offset in linear:
+        if offset is not None:
+            last = offset
+        filled.append(last)
+    return filled
+
+def write_indexed_lines(lines, filename, preset, header=''):
+    """Write header and lines (sorted by ref and begin) to filename as
+    BGZF and their tabix index to filename + '.tbi'. Returns the number of
+    lines written."""
+    writer = BgzfWriter(filename)
+    index = TabixIndex(preset)
+    writer.write(header)
+    written = 0
+    for line in lines:
+        start = writer.tell()
+        writer.write(line)
+        index.add(line, start, writer.tell())
+        written += 1
+    writer.close()
+    index.write(filename + '.tbi')
+    return written
+
+class TabixFile(object):
+    """A BGZF file opened together with its tabix index."""
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        self.index = TabixIndex.read(index_filename or filename + '.tbi')
+        self.reader = BgzfReader(filename)
+
+    @property
+    def refs(self):
+        return list(self.index.names)
+
+    def fetch_lines(self, ref, start, end):
+        """Yield the lines overlapping ref:start-end, a region given as in
+        tabix (1-based, both ends inclusive)."""
+        begin = start - 1
+        preset = self.index.preset
+        for chunk_start, chunk_end in self.index.chunks(ref, begin, end):
+            self.reader.seek(chunk_start)
+            while self.reader.tell() < chunk_end:
+                line = self.reader.readline()
+                if not line:
+                    break
+                if line.startswith(preset.meta):
+                    continue
+                line_ref, line_begin, line_end = preset.region(line)
+                if line_ref != ref or line_begin >= end:
+                    break
+                if line_end > begin:
+                    yield line
+
+    def close(self):
+        self.reader.close()
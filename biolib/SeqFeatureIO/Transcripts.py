@@ -0,0 +1,168 @@
+"""Assembly of GFF3 transcripts into BED12 records in a single pass.
+
+gff3_to_bed12 reads a GFF3 file once, collects the exon and CDS lines of
+each transcript under its ID and yields a Transcript as soon as all of its
+children are known to have been read:
+
+>>> for transcript in gff3_to_bed12(open('genes.gff3')):
+...     print transcript
+
+A transcript is complete
+  - at a '###' directive, which closes every feature read so far;
+  - with sorted_input=True, once the file has moved past the end of the
+    transcript (the file must then be sorted by ref and start, with each
+    transcript before its children);
+  - at the end of the file otherwise, which buffers the whole annotation.
+"""
+
+import heapq
+
+from GFF3IO import GFF3RecordIterator
+
+_bed_strands = {1: '+', -1: '-', 0: '.'}
+
+class Transcript(object):
+    """A transcript and its exons, printed as a BED12 line by str()."""
+    def __init__(self, name, transcript, exons, cds):
+        self.name = name
+        self.chrom = transcript.ref
+        self.strand = _bed_strands[transcript.strand]
+
+        # GFF3Record coordinates are 0-based with inclusive ends, BED ends
+        # are exclusive
+        exons = sorted(exons, key=lambda e: e.start)
+        self.start = exons[0].start
+        self.end = max(e.end for e in exons) + 1
+        if cds:
+            self.cds_start = min(c.start for c in cds)
+            self.cds_end = max(c.end for c in cds) + 1
+        else:
+            # non-coding, an empty thick part at the start as is usual
+            self.cds_start = self.cds_end = self.start
+        self.sizes = [e.end - e.start + 1 for e in exons]
+        self.starts = [e.start - self.start for e in exons]
+
+    def __str__(self):
+        return '\t'.join(
+            str(x) for x in [self.chrom,self.start,self.end,self.name,
+                             '0',self.strand,self.cds_start,self.cds_end,
+                             '0',len(self.sizes),
+                             ','.join(str(x) for x in self.sizes),
+                             ','.join(str(x) for x in self.starts)])
+
+class _DirectiveLines(object):
+    """The lines of handle, noting the '###' directives GFF3RecordIterator
+    skips so that they can be acted upon before the next record."""
+    def __init__(self, handle):
+        self.handle = handle
+        self.name = getattr(handle, 'name', handle)
+        self.directive = False
+
+    def __iter__(self):
+        for line in self.handle:
+            if line.startswith('###'):
+                self.directive = True
+            yield line
+
+class _Pending(object):
+    __slots__ = ('transcript', 'exons', 'cds', 'end')
+    def __init__(self):
+        self.transcript = None
+        self.exons = []
+        self.cds = []
+        self.end = -1
+
+def gff3_to_bed12(handle, transcript_type='mRNA', name_attribute='Name',
+                  exon_type='exon', cds_type='CDS', sorted_input=False):
+    """Generator function converting GFF3 transcripts to Transcript objects.
+
+    handle          - input GFF3 file
+    transcript_type - feature type of the transcripts (the BED12 records)
+    name_attribute  - attribute naming a transcript; its ID is used if the
+                      attribute is missing
+    exon_type       - feature type of the BED12 blocks
+    cds_type        - feature type delimiting the thick part
+    sorted_input    - whether the file is sorted by ref and start, each
+                      transcript before its children (ValueError if a
+                      transcript follows one of its children)
+    """
+    pending = {}
+    by_end = [] # heap of (end, ID) used with sorted_input=True
+    cur_ref = [None]
+
+    def complete(ids):
+        ready = []
+        for id in ids:
+            entry = pending.pop(id)
+            # children whose parent is not a transcript are dropped
+            if entry.transcript is not None and entry.exons:
+                attributes = entry.transcript.attributes
+                name = attributes.get(name_attribute, id)
+                ready.append(Transcript(name, entry.transcript,
+                                        entry.exons, entry.cds))
+        ready.sort(key=lambda t: (t.chrom, t.start))
+        return ready
+
+    def passed(record):
+        # IDs of the pending transcripts ending before record
+        if record.ref != cur_ref[0]:
+            cur_ref[0] = record.ref
+            del by_end[:]
+            return list(pending)
+        ids = []
+        while by_end and by_end[0][0] < record.start:
+            end, id = heapq.heappop(by_end)
+            entry = pending.get(id)
+            # an entry is pushed again whenever its end grows, the older
+            # pushes are stale
+            if entry is None or entry.end != end:
+                continue
+            ids.append(id)
+        return ids
+
+    def add(id, record):
+        entry = pending.get(id)
+        if entry is None:
+            entry = pending[id] = _Pending()
+        if record.end > entry.end:
+            entry.end = record.end
+            if sorted_input:
+                heapq.heappush(by_end, (entry.end, id))
+        return entry
+
+    lines = _DirectiveLines(handle)
+    for record in GFF3RecordIterator(lines):
+        if lines.directive:
+            lines.directive = False
+            for transcript in complete(list(pending)):
+                yield transcript
+            del by_end[:]
+
+        if sorted_input:
+            for transcript in complete(passed(record)):
+                yield transcript
+
+        if record.type == transcript_type:
+            id = record.id
+            if id is not None:
+                entry = add(id, record)
+                if sorted_input and entry.transcript is None and \
+                        (entry.exons or entry.cds):
+                    raise ValueError("Transcript %s follows its children in "
+                                     "%s, which is then not sorted as "
+                                     "sorted_input requires" %
+                                     (id, lines.name))
+                entry.transcript = record
+        elif record.type == exon_type or record.type == cds_type:
+            parents = record.attributes.get('Parent')
+            if parents is None:
+                continue
+            for parent in parents.split(','):
+                entry = add(parent, record)
+                if record.type == exon_type:
+                    entry.exons.append(record)
+                else:
+                    entry.cds.append(record)
+
+    for transcript in complete(list(pending)):
+        yield transcript
@@ -1,8 +1,21 @@
 """Supplement the missing support for SeqFeatureIO from biopython.
 Taken from SeqIO"""
 import os
+import multiprocessing
 import GFF3IO
 import GTFIO
+import BED
+import SweepLine
+from SweepLine import intersect, merge, subtract, closest
+import Columns
+from Columns import read_columns
+import Transcripts
+from Transcripts import gff3_to_bed12
+import Hierarchy
+from Hierarchy import FeatureHierarchy
+import Tabix
+import FeatureIndex
+from biolib.CompressedIO import open_file, is_compressed
 from StringIO import StringIO
 from Bio.SeqRecord import SeqRecord
 
@@ -16,11 +29,15 @@ from Bio.SeqRecord import SeqRecord
 #Most alignment file formats will be handled via Bio.AlignIO
 
 _FormatToIterator ={'gff3' : GFF3IO.GFF3Iterator,
+                    'gff3-record' : GFF3IO.GFF3RecordIterator,
                     'gtf'  : GTFIO.GTFIterator,
+                    'bed'  : BED.BEDIterator,
+                    'bed-record' : BED.BEDRecordIterator,
                     }
 
 _FormatToWriter ={'gff3' : GFF3IO.GFF3Writer,
                   'gtf'  : GTFIO.GTFWriter,
+                  'bed'  : BED.BEDWriter,
                   }
 
 readable_formats = _FormatToIterator.keys()
@@ -30,17 +47,17 @@ def write(features, handle, format) :
     """Write complete set of features to a file.
 
     features - A list (or iterator) of SeqFeature objects.
-    handle    - File handle object to write to.
+    handle    - File handle object to write to, or a filename (compressed
+                if it ends with .gz or .bz2, see CompressedIO).
     format    - lower case string describing the file format to write.
 
-    You should close the handle after calling this function.
+    You should close the handle after calling this function (a file opened
+    from a filename is closed here).
 
     Returns the number of records written (as an integer).
     """
 
     #Try and give helpful error messages:
-    if isinstance(handle, basestring) :
-        raise TypeError('Need a file handle, not a string (i.e. not a filename)')
     if not isinstance(format, basestring) :
         raise TypeError('Need a string for the file format (lower case)')
     if not format :
@@ -53,7 +70,14 @@ def write(features, handle, format) :
     #Map the file format to a writer class
     if format in _FormatToWriter :
         writer_class = _FormatToWriter[format]
-        count = writer_class(handle).write_file(features)
+        if isinstance(handle, basestring) :
+            handle = open_file(handle, 'w')
+            try:
+                count = writer_class(handle).write_file(features)
+            finally:
+                handle.close()
+        else:
+            count = writer_class(handle).write_file(features)
     else:
         raise ValueError('Unknown format "%s"' % format)
 
@@ -64,15 +88,14 @@ def write(features, handle, format) :
 def parse(handle, format):
     """Turns a sequence file into an iterator returning SeqRecords.
 
-    handle   - handle to the file.
+    handle   - handle to the file, or a filename (decompressed in a
+               background thread if it ends with .gz or .bz2).
     format   - lower case string describing the file format.
 
     Typical usage, opening a file to read in, and looping over the record(s):
 
     """
     #Try and give helpful error messages:
-    if isinstance(handle, basestring) :
-        raise TypeError("Need a file handle, not a string (i.e. not a filename)")
     if not isinstance(format, basestring) :
         raise TypeError("Need a string for the file format (lower case)")
     if not format :
@@ -83,10 +106,137 @@ def parse(handle, format):
     #Map the file format to a sequence iterator:    
     if format in _FormatToIterator :
         iterator_generator = _FormatToIterator[format]
+        if isinstance(handle, basestring) :
+            return _closing(iterator_generator, open_file(handle))
         return iterator_generator(handle)
     else :
         raise ValueError("Unknown format '%s'" % format)
 
+def _closing(iterator_generator, source, *args):
+    """Iterate over iterator_generator(source, *args), closing source (a
+    file or TabixFile opened here) once iteration ends or is abandoned."""
+    try:
+        for feature in iterator_generator(source, *args):
+            yield feature
+    finally:
+        source.close()
+
+def _byte_ranges(filename, chunk_size):
+    """Split filename into (start, end) byte ranges of about chunk_size
+    bytes, each ending just after a newline (or at the end of the file)."""
+    size = os.path.getsize(filename)
+    ranges = []
+    handle = open(filename, 'rb')
+    start = 0
+    while start < size:
+        handle.seek(start + chunk_size)
+        handle.readline()
+        end = min(handle.tell(), size)
+        ranges.append((start, end))
+        start = end
+    handle.close()
+    return ranges
+
+def _parse_byte_range(args):
+    """Worker for parse_parallel: parse one byte range with the format's
+    iterator and return function applied to its features."""
+    filename, format, start, end, function = args
+    handle = open(filename, 'rb')
+    handle.seek(start)
+    chunk = StringIO(handle.read(end - start))
+    handle.close()
+    chunk.name = filename
+    return function(_FormatToIterator[format](chunk))
+
+def parse_parallel(filename, format, function, processes=None,
+                   chunk_size=64*1024*1024):
+    """Parse a file in a pool of processes, applying function to the
+    features of each part of it in the workers. Returns an iterator over
+    the results of function for every part, in file order.
+
+    filename   - name of the file, which each worker opens itself.
+    format     - lower case string describing the file format.
+    function   - picklable (module level) function called with an iterator
+                 over the features of a part of the file, e.g. to count,
+                 filter or summarize them. Its result is sent back to this
+                 process, so it should be small compared to the features.
+    processes  - number of worker processes (default: one per core).
+    chunk_size - approximate number of bytes parsed by a worker at once.
+
+    >>> def exon_length(features):
+    ...     return sum(f.end - f.start + 1 for f in features if f.type == 'exon')
+    >>> total = sum(SeqFeatureIO.parse_parallel('genes.gff3', 'gff3-record',
+    ...                                          exon_length))
+
+    The file is split into byte ranges at line boundaries and each range is
+    parsed with the same iterator parse() would use. Line numbers in parse
+    errors are relative to the start of the range. Compressed files cannot
+    be split and are parsed by parse() in this process instead.
+
+    Only the per-part work runs in parallel: sending features back to this
+    process costs more than parsing them, so to iterate over the features
+    themselves use parse().
+    """
+    if not isinstance(filename, basestring) :
+        raise TypeError("Need a filename, not a file handle")
+    if format not in _FormatToIterator :
+        raise ValueError("Unknown format '%s'" % format)
+    if is_compressed(filename) :
+        return iter([function(parse(filename, format))])
+
+    tasks = [(filename, format, start, end, function)
+             for start, end in _byte_ranges(filename, chunk_size)]
+    return _parse_tasks(tasks, processes)
+
+def _parse_tasks(tasks, processes):
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(_parse_byte_range, tasks):
+            yield result
+    finally:
+        pool.terminate()
+
+def write_indexed(features, filename, format):
+    """Write coordinate-sorted features as a BGZF compressed file with a
+    tabix index (filename + '.tbi') for use with fetch().
+
+    features - A list (or iterator) of SeqFeature objects, grouped by ref
+               and sorted by start.
+    filename - name of the compressed file to write.
+    format   - lower case string describing the file format to write.
+
+    Returns the number of features written.
+    """
+    if format not in _FormatToWriter :
+        raise ValueError('Unknown format "%s"' % format)
+    if format not in Tabix.presets :
+        raise ValueError('No tabix preset for format "%s"' % format)
+    preset = Tabix.presets[format]
+    header = StringIO()
+    writer = _FormatToWriter[format](header)
+    writer.write_header()
+    lines = (writer.format_feature(feature) for feature in features)
+    return Tabix.write_indexed_lines(lines, filename, preset, header.getvalue())
+
+def fetch(source, ref, start, end, format):
+    """Return an iterator over the features of an indexed file overlapping
+    a region, reading only the blocks the index points to.
+
+    source - name of a file written by write_indexed (or by bgzip and
+             tabix), or an open Tabix.TabixFile to reuse across queries.
+    ref, start, end - the region, given as to tabix (1-based, inclusive).
+    format - lower case string describing the file format.
+    """
+    if format not in _FormatToIterator :
+        raise ValueError("Unknown format '%s'" % format)
+    if isinstance(source, basestring) :
+        return _closing(_fetch, Tabix.TabixFile(source), ref, start, end,
+                        format)
+    return _fetch(source, ref, start, end, format)
+
+def _fetch(source, ref, start, end, format):
+    return _FormatToIterator[format](source.fetch_lines(ref, start, end))
+
 def to_dict(features, key_function=None) :
     """Turns a sequence iterator or list into a dictionary.
 
@@ -150,6 +300,32 @@ def to_dict(features, key_function=None) :
             d[key] = [record]
     return d
 
+def index(filename, format, key_function=None, db=None) :
+    """Indexes a feature file, returning a dictionary like object.
+
+    filename     - name of the file to index.
+    format       - lower case string describing the file format.
+    key_function - Optional function which when given a feature returns
+                   the key to file it under (default: its name, as in
+                   to_dict). Features whose key is None are not indexed.
+    db           - Optional name of an SQLite database in which to keep
+                   the offsets, reused by later calls on the same file.
+
+    Unlike to_dict, only the byte offset of each feature is kept in memory
+    (or in the database); features are parsed when looked up:
+
+    >>> genes = SeqFeatureIO.index('genes.gtf', 'gtf',
+    ...                            key_function=lambda f : f.attributes['gene_id'])
+    >>> exons = genes['ENSG00000139618']
+    """
+    if not isinstance(filename, basestring) :
+        raise TypeError("Need a filename, not a file handle")
+    if format not in _FormatToIterator :
+        raise ValueError("Unknown format '%s'" % format)
+    if key_function is None :
+        key_function = lambda sf : sf.name
+    return FeatureIndex.FeatureIndex(filename, _FormatToIterator[format],
+                                     key_function, db, format)
 
 #if __name__ == "__main__":
 #Run the doctests
@@ -4,7 +4,9 @@ import math
 import operator
 import itertools
 
-import platform
+from CompressedIO import open_file, is_compressed
+import BinaryCseq
+import MappedArrays
 
 # given an iterable of pairs return the key corresponding to the greatest value
 def argmax(pairs,f=max):
@@ -26,15 +28,7 @@ def argmax_f(keys, f):
 def argmin_f(keys, f):
     return min(keys, key=f)
 
-try:
-    if platform.python_implementation() == "PyPy":
-        import numpypy as np
-        pypy = True
-    else:
-        import numpy as np
-        pypy = False
-except ImportError as err:
-        print err, "(problem importing NumPy or NumPyPy)"
+import numpy as np
 
 def log2_type(val):
     return float(np.log2(float(val)))
@@ -42,22 +36,74 @@ def log2_type(val):
 def pseudocount_log2_type(val):
     return float(np.log2(float(val)+1))
 
+_vtype_dtypes = {int: np.int64, float: np.float64}
+
+_whitespace = np.zeros(256,dtype=bool)
+_whitespace[[ord(c) for c in ' \t\n\r\v\f']] = True
+
+def _count_values(text):
+    # number of whitespace separated values in text, counted on the bytes
+    # without splitting them into strings
+    if not text:
+        return 0
+    space = _whitespace[np.frombuffer(text,dtype=np.uint8)]
+    return int(np.count_nonzero(space[:-1] & ~space[1:])) + (not space[0])
+
+def _parse_values(text,vtype=int,count=None):
+    # parse whitespace separated values into an array, checking that there
+    # are count of them; int and float are parsed without Python objects
+    dtype = _vtype_dtypes.get(vtype)
+    if dtype is None:
+        values = np.array([vtype(v) for v in text.split()])
+    else:
+        if count is None:
+            count = _count_values(text)
+        values = np.fromstring(text,dtype=dtype,sep=' ')
+    if count is not None and len(values) != count:
+        raise ValueError('Expected %d values, could parse %d' % (count,len(values)))
+    return values
+
+def _apply(func,values):
+    # call func on the whole array if it supports that, and on every
+    # element otherwise (e.g. for log2_type)
+    try:
+        result = func(values)
+    except (TypeError,ValueError):
+        result = None
+    if not isinstance(result,np.ndarray) or result.shape != values.shape:
+        result = np.array([func(v) for v in values.tolist()])
+    return result
+
+# strand hints of the range queries: 1 plus, -1 minus, 0 both strands
+_strand_codes = {'+': 1, 1: 1, 'plus': 1, 'pls': 1,
+                 '-': -1, -1: -1, 'minus': -1, 'mns': -1,
+                 '.': 0, 0: 0, None: 0, 'both': 0}
+
+def _strand_code(hint):
+    try:
+        return _strand_codes[hint]
+    except (KeyError,TypeError):
+        raise ValueError('Unknown strand key %s' % str(hint))
+
+def _log2(values,pseudocount=0):
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return np.log2(values + pseudocount)
+
 class Cseq(object):
     def __init__(self,name,pls,mns,header='',filename=None,default=0,refs=None):
         self.name = name
-        if isinstance(pls,dict):
-            self._pls = pls
-        else:
-            self._pls = { self.name:pls }
-        if isinstance(mns,dict):
-            self._mns = mns
-        else:
-            self._mns = { self.name:mns }
+        if not isinstance(pls,dict):
+            pls = { self.name:pls }
+        if not isinstance(mns,dict):
+            mns = { self.name:mns }
+        self._pls = dict((ref,np.asarray(v)) for ref,v in pls.items())
+        self._mns = dict((ref,np.asarray(v)) for ref,v in mns.items())
         if filename is not None:
             print 'warning: filename property is deprecated and is now name'
         self.default = default
         self.cur = self._pls.keys()[0]
         self.header = header
+        self._cumsums = {}
     @property
     def pls(self):
         return self._pls[self.cur]
@@ -77,32 +123,37 @@ class Cseq(object):
         return self
     @classmethod
     def from_file(cls,f,vtype=int,*args,**kwargs):
+        # f is read strictly sequentially so that pipes and compressed
+        # streams work; a filename is opened with open_file
+        if isinstance(f,basestring):
+            f = open_file(f)
+        lines = iter(f)
         header = ''
-        last_pos = 0
-        for line in f:
-            if line[:2] == '##':
-                header += line
-                last_pos += len(line)
-            else:
-                break
-        f.seek(last_pos)
-        name = os.path.basename(f.name)
-        cur = f.next().lstrip('#').strip()
-        pls = {cur:[]}
-        mns = {cur:[]}
-        for line in f:
+        line = next(lines)
+        while line[:2] == '##':
+            header += line
+            line = next(lines)
+        name = os.path.basename(getattr(f,'name',''))
+        pls = {}
+        mns = {}
+        def add(ref,data):
+            values = _parse_values(''.join(data),vtype,2*len(data))
+            pls[ref] = values[0::2].copy()
+            mns[ref] = values[1::2].copy()
+        cur = line.lstrip('#').strip()
+        data = []
+        for line in lines:
             if line[0] == '#':
+                add(cur,data)
                 cur = line.lstrip('#').strip()
-                pls[cur] = []
-                mns[cur] = []
+                data = []
                 continue
-            plsv,mnsv = line.strip().split()
-            pls[cur].append(vtype(plsv))
-            mns[cur].append(vtype(mnsv))
+            data.append(line)
+        add(cur,data)
         return cls(name,pls,mns,header,*args,**kwargs)
     def write(self,file,fmt='%d %d'):
         if not hasattr(file,'write'):
-            file = open(file,'w')
+            file = open_file(file,'w')
         file.write(self.header)
         if len(self.header) and not self.header.endswith('\n'):
             file.write('\n')
@@ -111,6 +162,51 @@ class Cseq(object):
             for p,m in iter(self.ref(ref)):
                 file.write(fmt%(p,m) + '\n')
         file.close()
+    def write_binary(self,filename,**kwargs):
+        """Write the values of every reference as a binary cseq file (see
+        BinaryCseq.write_refs for the keyword arguments)."""
+        BinaryCseq.write_refs(filename,self.refs,self._strands,self.name,
+                              self.header,**kwargs)
+    @classmethod
+    def from_binary(cls,filename,refs=None,*args,**kwargs):
+        """Read the references refs (default: all) of a binary cseq file."""
+        f = BinaryCseq.BinaryCseq(filename)
+        if refs is None:
+            refs = f.refs
+        pls = dict((ref,f.values(ref,'+')) for ref in refs)
+        mns = dict((ref,f.values(ref,'-')) for ref in refs)
+        f.close()
+        return cls(f.name,pls,mns,f.header,*args,**kwargs)
+    def write_mmap(self,filename):
+        """Write the values of every reference as raw arrays for
+        open_mmap()."""
+        arrays = []
+        for ref in self.refs:
+            pls,mns = self._strands(ref)
+            arrays += [(['pls',ref],pls),(['mns',ref],mns)]
+        MappedArrays.write(filename,arrays,name=self.name,header=self.header,
+                           refs=list(self.refs))
+    @classmethod
+    def open_mmap(cls,filename,*args,**kwargs):
+        """Map a file written by write_mmap(). The strands are read-only
+        views of the mapping, as are their slices, so processes opening the
+        same file share its pages (see MappedArrays)."""
+        meta,arrays = MappedArrays.load(filename)
+        pls = {}
+        mns = {}
+        for (strand,ref),values in arrays:
+            (pls if strand == 'pls' else mns)[ref] = values
+        result = cls(meta['name'],pls,mns,meta['header'],*args,**kwargs)
+        result.cur = meta['refs'][0]
+        return result
+    @classmethod
+    def from_coverage(cls,builder,name='coverage',header='',*args,**kwargs):
+        """Make a Cseq of the coverage of a Coverage.CoverageBuilder."""
+        pls,mns = builder.arrays()
+        result = cls(name,pls,mns,header,*args,**kwargs)
+        if builder.refs:
+            result.cur = builder.refs[0]
+        return result
     def get_strand(self,hint):
         if hint == '+' or hint == 1 or hint == 'plus' or hint == 'pls':
             return self.pls
@@ -118,11 +214,123 @@ class Cseq(object):
             return self.mns
         else:
             raise ValueError, 'Unknown strand key %s' % str(hint)
-    def apply(self,func):
-        for ref in self.refs:
-            for i in range(len(self.ref(ref))):
-                self.pls[i] = func(self.pls[i])
-                self.mns[i] = func(self.mns[i])
+    def _copy(self,pls,mns):
+        result = Cseq(self.name,pls,mns,self.header,default=self.default)
+        result.cur = self.cur
+        return result
+    def apply(self,func,inplace=True):
+        """Apply func to the values of both strands of every reference.
+
+        func is called with whole arrays (e.g. np.sqrt), or with every
+        value if it fails on them. With inplace=False a new Cseq is
+        returned and self is left unchanged.
+        """
+        pls = dict((ref,_apply(func,v)) for ref,v in self._pls.items())
+        mns = dict((ref,_apply(func,v)) for ref,v in self._mns.items())
+        if not inplace:
+            return self._copy(pls,mns)
+        self._pls = pls
+        self._mns = mns
+        self._cumsums = {}
+        return self
+    def log2(self,pseudocount=0,inplace=True):
+        """log2(value + pseudocount) of every value (-inf for 0)."""
+        return self.apply(lambda v: _log2(v,pseudocount),inplace)
+    def _strands(self,refname):
+        if refname not in self._pls:
+            raise ValueError, 'Invalid refname %s' % refname
+        return self._pls[refname],self._mns[refname]
+    def _cumsum(self,refname,strand):
+        # prefix sums with a leading 0, built on first use; strands are
+        # not expected to change in place between queries
+        key = (refname,strand)
+        cumsum = self._cumsums.get(key)
+        if cumsum is None:
+            values = self._strands(refname)[0 if strand == 1 else 1]
+            cumsum = np.zeros(len(values)+1,dtype=np.result_type(values,np.int64))
+            np.cumsum(values,out=cumsum[1:])
+            self._cumsums[key] = cumsum
+        return cumsum
+    def _strand_sums(self,refname,strand,starts,ends):
+        # positions past the end of a strand have the default value
+        cumsum = self._cumsum(refname,strand)
+        n = len(cumsum) - 1
+        return cumsum[np.minimum(ends,n)] - cumsum[np.minimum(starts,n)] + \
+            self.default * (np.maximum(ends,n) - np.maximum(starts,n))
+    def range_sums(self,refs,starts,ends,strands=None):
+        """Sum the values of many ranges, start to end as in a slice.
+
+        refs    - a reference name, or one per range
+        starts  - array of range starts
+        ends    - array of range ends
+        strands - a strand ('+', '-', 1, -1, ...), or one per range; None,
+                  0, '.' or 'both' sum both strands (the default)
+
+        Each sum takes two lookups in the prefix sums of its reference
+        strand, built the first time the strand is queried.
+        """
+        starts = np.asarray(starts,dtype=np.int64)
+        ends = np.asarray(ends,dtype=np.int64)
+        if np.any(starts < 0) or np.any(ends < starts):
+            raise ValueError('Ranges need 0 <= start <= end')
+        if isinstance(strands,(list,tuple,np.ndarray)):
+            codes = np.array([_strand_code(s) for s in strands],dtype=np.int8)
+        else:
+            codes = np.repeat(np.int8(_strand_code(strands)),len(starts))
+        if isinstance(refs,basestring):
+            groups = [(refs,slice(None))]
+        else:
+            refs = np.asarray(refs)
+            groups = [(str(ref),refs == ref) for ref in np.unique(refs)]
+        result = np.zeros(len(starts),dtype=np.int64)
+        for ref,rows in groups:
+            s = starts[rows]
+            e = ends[rows]
+            c = codes[rows]
+            sums = 0
+            if np.any(c >= 0):
+                sums = sums + np.where(c >= 0,self._strand_sums(ref,1,s,e),0)
+            if np.any(c <= 0):
+                sums = sums + np.where(c <= 0,self._strand_sums(ref,-1,s,e),0)
+            result = result.astype(np.result_type(result,sums),copy=False)
+            result[rows] = sums
+        return result
+    def range_means(self,refs,starts,ends,strands=None):
+        """Sum of many ranges (see range_sums) divided by their length, so
+        with both strands the mean of the per-position strand totals.
+        Empty ranges are NaN."""
+        starts = np.asarray(starts,dtype=np.int64)
+        ends = np.asarray(ends,dtype=np.int64)
+        sums = self.range_sums(refs,starts,ends,strands)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return sums / (ends - starts).astype(np.float64)
+    def range_sum(self,ref,start,end,strand=None):
+        """Sum of the values of positions start to end (as in a slice) of
+        a reference strand, or of both strands if strand is None."""
+        return self.range_sums(ref,[start],[end],strand)[0]
+    def range_mean(self,ref,start,end,strand=None):
+        """Mean of the values of positions start to end (see range_sum)."""
+        return self.range_means(ref,[start],[end],strand)[0]
+    def _feature_ranges(self,features,stranded):
+        refs = []
+        starts = []
+        ends = []
+        strands = []
+        for feature in features:
+            refs.append(feature.ref)
+            # feature ends are inclusive
+            starts.append(int(feature.location.nofuzzy_start))
+            ends.append(int(feature.location.nofuzzy_end)+1)
+            strands.append(feature.strand if stranded else 0)
+        return refs,starts,ends,strands
+    def feature_sums(self,features,stranded=True):
+        """Sum the values under each feature of an iterable, e.g. from
+        SeqFeatureIO.parse, on the strand of the feature (or on both strands
+        if not stranded or the feature is unstranded)."""
+        return self.range_sums(*self._feature_ranges(features,stranded))
+    def feature_means(self,features,stranded=True):
+        """Mean value under each feature (see feature_sums)."""
+        return self.range_means(*self._feature_ranges(features,stranded))
     def __iter__(self):
         return itertools.izip_longest(self.pls,self.mns,fillvalue=self.default)
     def __getitem__(self,k):
@@ -141,7 +349,7 @@ class Cseq(object):
 class CseqFileIter(object):
     def __init__(self,file,vtype=int):
         if not hasattr(file,'read'):
-            self.file = open(file)
+            self.file = open_file(file)
         else:
             self.file = file
         #self.name = self.file.next().lstrip('#').strip()
@@ -152,23 +360,225 @@ class CseqFileIter(object):
     def next(self):
         return [self.vtype(v) for v in self.file.next().split()]
      
+class IndexedCseq(Cseq):
+    """A Cseq over an uncompressed cseq file that loads references on demand.
+
+    Opening the file only scans it for the '#ref' lines and records the
+    byte range of every reference. A reference is read when it is selected
+    with ref() (or its values are otherwise accessed) into NumPy arrays, of
+    the type given by the array typecode if any (e.g. 'i' or 'f' to halve
+    the memory of int or float values) and of the dtype of vtype otherwise.
+    At most max_loaded references are kept in memory (None keeps them all);
+    the least recently selected one is dropped first. stream() iterates
+    over a reference without loading it.
+
+    Functions given to apply() are recorded and applied to every reference
+    as it is loaded, so they hold for references dropped and read again.
+    Their results are converted to the typecode, if given.
+    """
+    def __init__(self,filename,vtype=int,typecode=None,max_loaded=1,default=0,
+                 chunk_size=8*1024*1024):
+        if is_compressed(filename):
+            raise ValueError('%s is compressed; IndexedCseq needs to seek, '
+                             'use Cseq.from_file' % filename)
+        self.name = os.path.basename(filename)
+        self.vtype = vtype
+        self.typecode = typecode
+        self.max_loaded = max_loaded
+        self.default = default
+        self.chunk_size = chunk_size
+        self._handle = open(filename,'rb')
+        self._pls = {}
+        self._mns = {}
+        self._transforms = []
+        self._order = [] # loaded references, least recently selected first
+        self._cumsums = {}
+        self._scan()
+        self.cur = self._refs[0]
+    def _scan(self):
+        # read the '##' header, then search whole blocks for line starts
+        # with '#' rather than iterating over the lines
+        f = self._handle
+        self.header = ''
+        offset = 0
+        for line in f:
+            if line[:2] != '##':
+                break
+            self.header += line
+            offset += len(line)
+        size = os.fstat(f.fileno()).st_size
+        if offset >= size:
+            raise ValueError('No references in %s' % self._handle.name)
+        starts = []
+        f.seek(offset)
+        base = offset
+        previous = '\n'
+        while True:
+            block = f.read(self.chunk_size)
+            if not block:
+                break
+            data = previous[-1] + block
+            i = data.find('\n#')
+            while i >= 0:
+                starts.append(base + i)
+                i = data.find('\n#',i+1)
+            base += len(block)
+            previous = block
+        if not starts or starts[0] != offset:
+            raise ValueError('Expected a #ref line at byte %d of %s' %
+                             (offset,self._handle.name))
+        self._refs = []
+        self._index = {}
+        for i,start in enumerate(starts):
+            f.seek(start)
+            line = f.readline()
+            ref = line.lstrip('#').strip()
+            end = starts[i+1] if i+1 < len(starts) else size
+            self._refs.append(ref)
+            self._index[ref] = (start + len(line),end)
+    @property
+    def refs(self):
+        return list(self._refs)
+    @property
+    def loaded(self):
+        return list(self._pls)
+    def _chunks(self,refname):
+        # blocks of whole lines of a reference
+        start,end = self._index[refname]
+        self._handle.seek(start)
+        remaining = end - start
+        carry = ''
+        while remaining > 0:
+            data = self._handle.read(min(self.chunk_size,remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            data = carry + data
+            cut = data.rfind('\n') + 1 if remaining > 0 else len(data)
+            carry = data[cut:]
+            yield data[:cut]
+    def _parse_chunk(self,data):
+        lines = data.count('\n') + (not data.endswith('\n') and bool(data.strip()))
+        try:
+            values = _parse_values(data,self.vtype,2*lines)
+        except ValueError:
+            raise ValueError('Expected two values per line in %s' %
+                             self._handle.name)
+        pls = values[0::2].copy()
+        mns = values[1::2].copy()
+        for func in self._transforms:
+            pls = _apply(func,pls)
+            mns = _apply(func,mns)
+        return self._typed(pls),self._typed(mns)
+    def _typed(self,values):
+        if self.typecode is None:
+            return values
+        return values.astype(self.typecode,copy=False)
+    def stream(self,refname):
+        """Iterate over the (plus, minus) values of a reference without
+        loading it."""
+        if refname not in self._index:
+            raise ValueError, 'Invalid refname %s' % refname
+        for data in self._chunks(refname):
+            pls,mns = self._parse_chunk(data)
+            for pair in itertools.izip(pls,mns):
+                yield pair
+    def load(self,refname):
+        """Read a reference into memory (if it is not already)."""
+        if refname not in self._index:
+            raise ValueError, 'Invalid refname %s' % refname
+        if refname in self._pls:
+            return
+        chunks = [self._parse_chunk(data) for data in self._chunks(refname)]
+        if not chunks:
+            chunks = [self._parse_chunk('')]
+        self._pls[refname] = np.concatenate([pls for pls,mns in chunks])
+        self._mns[refname] = np.concatenate([mns for pls,mns in chunks])
+    def unload(self,refname):
+        """Drop a loaded reference from memory."""
+        self._pls.pop(refname,None)
+        self._mns.pop(refname,None)
+        self._cumsums.pop((refname,1),None)
+        self._cumsums.pop((refname,-1),None)
+        if refname in self._order:
+            self._order.remove(refname)
+    def ref(self,refname):
+        self.load(refname)
+        if refname in self._order:
+            self._order.remove(refname)
+        self._order.append(refname)
+        if self.max_loaded is not None:
+            while len(self._order) > self.max_loaded:
+                self.unload(self._order[0])
+        self.cur = refname
+        return self
+    @property
+    def pls(self):
+        if self.cur not in self._pls:
+            self.ref(self.cur)
+        return self._pls[self.cur]
+    @property
+    def mns(self):
+        if self.cur not in self._mns:
+            self.ref(self.cur)
+        return self._mns[self.cur]
+    def apply(self,func,inplace=True):
+        if not inplace:
+            result = IndexedCseq(self._handle.name,self.vtype,self.typecode,
+                                 self.max_loaded,self.default,self.chunk_size)
+            result._transforms = self._transforms + [func]
+            result.cur = self.cur
+            return result
+        self._transforms.append(func)
+        for refname in self._pls:
+            self._pls[refname] = self._typed(_apply(func,self._pls[refname]))
+            self._mns[refname] = self._typed(_apply(func,self._mns[refname]))
+        self._cumsums = {}
+        return self
+    def _strands(self,refname):
+        cur = self.cur
+        self.ref(refname)
+        self.cur = cur
+        return self._pls[refname],self._mns[refname]
+    def close(self):
+        self._handle.close()
+
 class Eseq(object):
     def __init__(self,name,values,filename=None):
         self.name = name
-        self.values = values
+        self.values = np.asarray(values)
         self.filename = filename
     @classmethod
     def from_file(cls,f,vtype=int):
-        name = f.next().lstrip('>').strip()
-        values = []
-        for line in f:
-            for x in line.strip().split():
-                values.append(vtype(x))
-        return cls(name,values,filename=f.name)
+        if isinstance(f,basestring):
+            f = open_file(f)
+        lines = iter(f)
+        name = next(lines).lstrip('>').strip()
+        values = _parse_values(''.join(lines),vtype)
+        return cls(name,values,filename=getattr(f,'name',None))
+    def apply(self,func,inplace=True):
+        """Apply func to the values, as Cseq.apply."""
+        values = _apply(func,self.values)
+        if not inplace:
+            return Eseq(self.name,values,self.filename)
+        self.values = values
+        return self
+    def log2(self,pseudocount=0,inplace=True):
+        """log2(value + pseudocount) of every value (-inf for 0)."""
+        return self.apply(lambda v: _log2(v,pseudocount),inplace)
+    def write_mmap(self,filename):
+        """Write the values as a raw array for open_mmap()."""
+        MappedArrays.write(filename,[('values',self.values)],name=self.name)
+    @classmethod
+    def open_mmap(cls,filename):
+        """Map a file written by write_mmap(); values is a read-only view of
+        the mapping (see MappedArrays)."""
+        meta,arrays = MappedArrays.load(filename)
+        return cls(meta['name'],arrays[0][1],filename=filename)
     def log_transform(self,base=2):
-        #old = np.seterr(all='ignore') # avoid log2(0) error warnings
-        self.values = [float(np.log2(v)) for v in self.values]
-        #np.seterr(**old)
+        if base == 2:
+            return self.log2()
+        return self.apply(lambda v: _log2(v)/np.log2(base))
     def __iter__(self):
         return iter(self.values)
     def __getitem__(self,k):
@@ -177,38 +587,29 @@ class Eseq(object):
         return len(self.values)
         
 def parse_cseq(filename,vtype=int):
-    return Cseq.from_file(open(filename),vtype)
+    return Cseq.from_file(open_file(filename),vtype)
 def parse_float_cseq(filename):
-    return Cseq.from_file(open(filename),float)
+    return Cseq.from_file(open_file(filename),float)
 def parse_cseq_log2_transform(filename):
-    if not pypy:
-        old = np.seterr(all='ignore') # avoid log2(0) error warnings
-    eseq = Cseq.from_file(open(filename),log2_type)
-    if not pypy:
-        np.seterr(**old)
-    return eseq
+    return Cseq.from_file(open_file(filename),float).log2()
 def parse_cseq_pseudocount_log2_transform(filename):
-    if not pypy:
-        old = np.seterr(all='ignore') # avoid log2(0) error warnings
-    eseq = Cseq.from_file(open(filename),pseudocount_log2_type)
-    if not pypy:
-        np.seterr(**old)
-    return eseq
+    return Cseq.from_file(open_file(filename),float).log2(pseudocount=1)
+
+def open_cseq(filename,vtype=int,typecode=None,max_loaded=1):
+    return IndexedCseq(filename,vtype,typecode,max_loaded)
+
+def parse_binary_cseq(filename):
+    return Cseq.from_binary(filename)
 
 def cseq_file_iter(filename,vtype=int):
     return CseqFileIter(filename,vtype)
 
 def parse_eseq(filename,vtype=int):
-    return Eseq.from_file(open(filename),vtype)
+    return Eseq.from_file(open_file(filename),vtype)
 def parse_float_eseq(filename):
-    return Eseq.from_file(open(filename),float)
+    return Eseq.from_file(open_file(filename),float)
 def parse_eseq_log2_transform(filename):
-    if not pypy:
-        old = np.seterr(all='ignore') # avoid log2(0) error warnings
-    eseq = Eseq.from_file(open(filename),log2_type)
-    if not pypy:
-        np.seterr(**old)
-    return eseq
+    return Eseq.from_file(open_file(filename),float).log2()
 
 def write_eseq(stream,iterable,name='eseq',width=60,fmt='%d '):
     cur_line = ''
@@ -1,3 +1,16 @@
+"""SAM flag constants, and flag filtering and counting over many alignments
+at once.
+
+A FlagFilter compiles the include (-f) and exclude (-F) masks of samtools
+view and tests single flags or whole NumPy arrays of flags:
+
+>>> keep = FlagFilter(include='PAIRED', exclude=BAM_FUNMAP | BAM_FDUP)
+>>> flags[keep.mask(flags)]
+
+flagstat() counts the categories of samtools flagstat over a stream of SAM
+text lines, reading them in chunks of NumPy arrays.
+"""
+
 ## @abstract the read is paired in sequencing, no matter whether it is mapped in a pair 
 BAM_FPAIRED       =1
 # the read is mapped in a proper pair 
@@ -20,3 +33,126 @@ BAM_FSECONDARY   =256
 BAM_FQCFAIL      =512
 # optical or PCR duplicate
 BAM_FDUP        =1024
+# supplementary alignment
+BAM_FSUPPLEMENTARY =2048
+
+import numpy as np
+
+from CompressedIO import open_file
+
+# flag names as used by samtools
+flag_names = {'PAIRED': BAM_FPAIRED, 'PROPER_PAIR': BAM_FPROPER_PAIR,
+              'UNMAP': BAM_FUNMAP, 'MUNMAP': BAM_FMUNMAP,
+              'REVERSE': BAM_FREVERSE, 'MREVERSE': BAM_FMREVERSE,
+              'READ1': BAM_FREAD1, 'READ2': BAM_FREAD2,
+              'SECONDARY': BAM_FSECONDARY, 'QCFAIL': BAM_FQCFAIL,
+              'DUP': BAM_FDUP, 'SUPPLEMENTARY': BAM_FSUPPLEMENTARY}
+
+def parse_flags(spec):
+    """Return the integer mask of spec: an int, a decimal, hexadecimal
+    (0x) or octal (0) string, or comma separated flag names such as
+    'UNMAP,SECONDARY'."""
+    if isinstance(spec, (int, long, np.integer)):
+        return int(spec)
+    spec = spec.strip()
+    if not spec:
+        return 0
+    if spec[0].isdigit():
+        return int(spec, 0)
+    mask = 0
+    for name in spec.split(','):
+        try:
+            mask |= flag_names[name.strip().upper()]
+        except KeyError:
+            raise ValueError('Unknown flag name %s' % name)
+    return mask
+
+class FlagFilter(object):
+    """Keep alignments having all include flags and none of the exclude
+    flags (samtools view -f include -F exclude). Masks are given as
+    accepted by parse_flags."""
+    def __init__(self, include=0, exclude=0):
+        self.include = parse_flags(include)
+        self.exclude = parse_flags(exclude)
+
+    def __call__(self, flag):
+        return flag & self.include == self.include and not flag & self.exclude
+
+    def mask(self, flags):
+        """Return the boolean array of the flags passing the filter."""
+        flags = np.asarray(flags)
+        return ((flags & self.include) == self.include) & \
+            ((flags & self.exclude) == 0)
+
+    def filter(self, flags):
+        """Return the flags passing the filter."""
+        flags = np.asarray(flags)
+        return flags[self.mask(flags)]
+
+def _alignment_chunks(lines, chunk_size):
+    # lists of up to chunk_size alignment (non header) lines
+    chunk = []
+    for line in lines:
+        if line[0] == '@':
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def read_flags(lines, chunk_size=1<<20):
+    """Return an iterator over the flags of the alignments of SAM text lines
+    (or of a SAM file given by name), as arrays of up to chunk_size flags."""
+    if isinstance(lines, basestring):
+        lines = open_file(lines)
+    for chunk in _alignment_chunks(lines, chunk_size):
+        yield np.array([int(line.split('\t', 2)[1]) for line in chunk],
+                       dtype=np.int64)
+
+flagstat_categories = ['total', 'secondary', 'supplementary', 'duplicates',
+                       'mapped', 'paired in sequencing', 'read1', 'read2',
+                       'properly paired', 'with itself and mate mapped',
+                       'singletons', 'with mate mapped to a different chr',
+                       'with mate mapped to a different chr (mapQ>=5)']
+
+def _flagstat_chunk(flags, mapqs, other_ref):
+    """Counts of every category of one chunk of alignments, as a
+    (categories, 2) array of QC passed and failed counts."""
+    def has(flag):
+        return (flags & flag) != 0
+    primary = ~has(BAM_FSECONDARY) & ~has(BAM_FSUPPLEMENTARY)
+    paired = primary & has(BAM_FPAIRED)
+    both_mapped = paired & ~has(BAM_FUNMAP) & ~has(BAM_FMUNMAP)
+    different_ref = both_mapped & other_ref
+    masks = [np.ones(len(flags), dtype=bool), has(BAM_FSECONDARY),
+             has(BAM_FSUPPLEMENTARY), has(BAM_FDUP), ~has(BAM_FUNMAP),
+             paired, paired & has(BAM_FREAD1), paired & has(BAM_FREAD2),
+             paired & has(BAM_FPROPER_PAIR) & ~has(BAM_FUNMAP),
+             both_mapped, paired & ~has(BAM_FUNMAP) & has(BAM_FMUNMAP),
+             different_ref, different_ref & (mapqs >= 5)]
+    failed = has(BAM_FQCFAIL)
+    return np.array([[np.count_nonzero(m & ~failed), np.count_nonzero(m & failed)]
+                     for m in masks], dtype=np.int64)
+
+def flagstat(lines, chunk_size=1<<20):
+    """Count the alignments of SAM text lines (or of a SAM file, possibly
+    .gz or .bz2 compressed, given by name) in the categories of samtools
+    flagstat.
+
+    Returns a dict mapping each of flagstat_categories to a pair of counts
+    for QC passed and QC failed alignments.
+    """
+    if isinstance(lines, basestring):
+        lines = open_file(lines)
+    counts = np.zeros((len(flagstat_categories), 2), dtype=np.int64)
+    for chunk in _alignment_chunks(lines, chunk_size):
+        fields = [line.split('\t', 8) for line in chunk]
+        flags = np.array([int(f[1]) for f in fields], dtype=np.int64)
+        mapqs = np.array([int(f[4]) for f in fields], dtype=np.int64)
+        other_ref = np.array([f[6] != '=' and f[6] != '*' and f[6] != f[2]
+                              for f in fields], dtype=bool)
+        counts += _flagstat_chunk(flags, mapqs, other_ref)
+    return dict((category, tuple(int(x) for x in count))
+                for category, count in zip(flagstat_categories, counts))